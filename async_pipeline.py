@@ -0,0 +1,253 @@
+"""
+Overlapped ingestion: PDFs -> docling -> chunks -> embeddings -> FAISS index.
+
+Each stage is an asyncio task reading from a bounded queue and pushing to
+the next one, with the CPU-heavy work running in executors:
+
+    convert  process pool, one warm converter per worker (batch_convert.init_worker)
+    chunk    thread pool; Markdown is built in memory, exports are written
+             alongside on their own `export_workers` threads, so slow disk
+             writes never hold up chunking, embedding or indexing
+    embed    thread pool; fills the embedding cache
+    index    single consumer; PersistentIndex.add_document then finds every
+             vector in the embedding cache
+
+So document N+1 converts while document N is chunked and embedded. The
+bounded queues keep a fast stage from running arbitrarily far ahead of a
+slow one. The report gives each stage's busy time, utilization and the
+depth of its input queue, which is what is needed to size the stages.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+_log = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    items: int = 0
+    busy_seconds: float = 0.0
+    depth_samples: List[int] = field(default_factory=list)
+
+    def utilization(self, wall_seconds: float) -> float:
+        return self.busy_seconds / (wall_seconds * self.workers) if wall_seconds else 0.0
+
+    @property
+    def max_depth(self) -> int:
+        return max(self.depth_samples, default=0)
+
+    @property
+    def mean_depth(self) -> float:
+        return sum(self.depth_samples) / len(self.depth_samples) if self.depth_samples else 0.0
+
+
+@dataclass
+class PipelineReport:
+    stages: Dict[str, StageStats]
+    wall_seconds: float = 0.0
+    documents: int = 0
+    chunks: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return {
+            "wall_seconds": round(self.wall_seconds, 3),
+            "documents": self.documents,
+            "chunks": self.chunks,
+            "failed": self.failed,
+            "stages": {
+                name: {
+                    "workers": s.workers,
+                    "items": s.items,
+                    "busy_seconds": round(s.busy_seconds, 3),
+                    "utilization": round(s.utilization(self.wall_seconds), 3),
+                    "queue_max": s.max_depth,
+                    "queue_mean": round(s.mean_depth, 2),
+                }
+                for name, s in self.stages.items()
+            },
+        }
+
+
+def _convert_document(pdf_path: str):
+    from batch_convert import get_worker_converter
+    from conversion_cache import cached_convert
+
+    return cached_convert(get_worker_converter(), Path(pdf_path)).document
+
+
+def _chunk_document(document, chunk_size: int, chunk_overlap: int) -> List[str]:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return splitter.split_text(document.export_to_markdown())
+
+
+class IngestPipeline:
+    def __init__(self, index=None, output_dir: Optional[Path] = Path("output"), convert_workers: int = 2,
+                 chunk_workers: int = 2, embed_workers: int = 1, export_workers: int = 1, queue_size: int = 4,
+                 chunk_size: int = 2000, chunk_overlap: int = 100, sample_interval: float = 0.1):
+        self.index = index
+        self.output_dir = output_dir
+        self.workers = {"convert": convert_workers, "chunk": chunk_workers, "embed": embed_workers, "index": 1}
+        self.export_workers = export_workers
+        self.queue_size = queue_size
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.sample_interval = sample_interval
+
+    async def _stage(self, stats: StageStats, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue],
+                     work, report: PipelineReport):
+        """
+        Consume `inbox` until an end marker, apply `work(item)` and pass the
+        result on. Each worker of a stage receives its own end marker.
+        """
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                return
+            name, payload = item
+            start_time = time.perf_counter()
+            try:
+                result = await work(name, payload)
+            except Exception as e:
+                _log.exception(f"{stats.name} failed for {name}")
+                report.failed[name] = f"{stats.name}: {type(e).__name__}: {e}"
+                continue
+            finally:
+                stats.busy_seconds += time.perf_counter() - start_time
+            stats.items += 1
+            if outbox is not None:
+                await outbox.put((name, result))
+
+    async def _run_stage(self, name: str, stats: Dict[str, StageStats], inbox, outbox, work, report,
+                         downstream: Optional[str] = None):
+        await asyncio.gather(*(self._stage(stats[name], inbox, outbox, work, report)
+                               for _ in range(self.workers[name])))
+        if outbox is not None:
+            for _ in range(self.workers[downstream]):
+                await outbox.put(_DONE)
+
+    async def _monitor(self, queues: Dict[str, asyncio.Queue], stats: Dict[str, StageStats]):
+        while True:
+            for name, q in queues.items():
+                stats[name].depth_samples.append(q.qsize())
+            await asyncio.sleep(self.sample_interval)
+
+    async def run(self, pdfs: List[Path]) -> PipelineReport:
+        from batch_convert import init_worker
+        from stream_export import export_document
+        from vector_index import PersistentIndex
+
+        loop = asyncio.get_running_loop()
+        index = self.index or await loop.run_in_executor(None, PersistentIndex.load_or_create)
+        stats = {name: StageStats(name, workers) for name, workers in self.workers.items()}
+        report = PipelineReport(stages=stats)
+        queues = {name: asyncio.Queue(maxsize=self.queue_size) for name in self.workers}
+        export_tasks = []
+
+        convert_pool = ProcessPoolExecutor(max_workers=self.workers["convert"], initializer=init_worker)
+        thread_pool = ThreadPoolExecutor(max_workers=self.workers["chunk"] + self.workers["embed"] + 1)
+        export_pool = ThreadPoolExecutor(max_workers=self.export_workers, thread_name_prefix="export")
+
+        async def convert(name, pdf_path):
+            return await loop.run_in_executor(convert_pool, _convert_document, str(pdf_path))
+
+        async def chunk(name, document):
+            if self.output_dir is not None:
+                export_tasks.append((name, loop.run_in_executor(export_pool, export_document, document,
+                                                                self.output_dir, name)))
+            chunks = await loop.run_in_executor(thread_pool, _chunk_document, document,
+                                                self.chunk_size, self.chunk_overlap)
+            report.documents += 1
+            report.chunks += len(chunks)
+            return chunks
+
+        async def embed(name, chunks):
+            await loop.run_in_executor(thread_pool, index.embeddings.embed_documents, chunks)
+            return chunks
+
+        async def add_to_index(name, chunks):
+            await loop.run_in_executor(thread_pool, index.add_document, name, chunks)
+
+        async def feed():
+            for pdf_path in pdfs:
+                await queues["convert"].put((Path(pdf_path).stem, pdf_path))
+            for _ in range(self.workers["convert"]):
+                await queues["convert"].put(_DONE)
+
+        start_time = time.perf_counter()
+        monitor = asyncio.create_task(self._monitor(queues, stats))
+        try:
+            await asyncio.gather(
+                feed(),
+                self._run_stage("convert", stats, queues["convert"], queues["chunk"], convert, report, "chunk"),
+                self._run_stage("chunk", stats, queues["chunk"], queues["embed"], chunk, report, "embed"),
+                self._run_stage("embed", stats, queues["embed"], queues["index"], embed, report, "index"),
+                self._run_stage("index", stats, queues["index"], None, add_to_index, report),
+            )
+            results = await asyncio.gather(*(task for _, task in export_tasks), return_exceptions=True)
+            for (name, _), result in zip(export_tasks, results):
+                if isinstance(result, Exception):
+                    _log.error(f"export failed for {name}: {result}")
+                    report.failed[name] = f"export: {type(result).__name__}: {result}"
+        finally:
+            monitor.cancel()
+            # Whatever was embedded and indexed is kept, even if a stage blew up.
+            await loop.run_in_executor(thread_pool, index.save)
+            convert_pool.shutdown()
+            thread_pool.shutdown()
+            export_pool.shutdown()
+        report.wall_seconds = time.perf_counter() - start_time
+        return report
+
+
+def print_report(report: PipelineReport):
+    print(f"\n✅ {report.documents} documents, {report.chunks} chunks in {report.wall_seconds:.2f}s")
+    print(f"   {'stage':<8} {'workers':>7} {'items':>6} {'busy s':>8} {'util':>6} {'queue max':>9} {'mean':>6}")
+    for name, s in report.stages.items():
+        print(f"   {name:<8} {s.workers:>7} {s.items:>6} {s.busy_seconds:>8.2f} "
+              f"{s.utilization(report.wall_seconds):>6.0%} {s.max_depth:>9} {s.mean_depth:>6.2f}")
+    for name, error in report.failed.items():
+        print(f"❌ {name}: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest PDFs with conversion, embedding and indexing overlapped.")
+    parser.add_argument("inputs", nargs="*", default=["input"])
+    parser.add_argument("-o", "--output-dir", default="output", help="Where to write exports ('' to skip)")
+    parser.add_argument("--convert-workers", type=int, default=2)
+    parser.add_argument("--chunk-workers", type=int, default=2)
+    parser.add_argument("--embed-workers", type=int, default=1)
+    parser.add_argument("--export-workers", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=4)
+    args = parser.parse_args()
+
+    from batch_convert import collect_pdfs
+    from only_docling import configure_logging
+
+    configure_logging()
+    pdfs = collect_pdfs(args.inputs)
+    pipeline = IngestPipeline(
+        output_dir=Path(args.output_dir) if args.output_dir else None,
+        convert_workers=args.convert_workers,
+        chunk_workers=args.chunk_workers,
+        embed_workers=args.embed_workers,
+        export_workers=args.export_workers,
+        queue_size=args.queue_size,
+    )
+    print_report(asyncio.run(pipeline.run(pdfs)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from docling.datamodel.base_models import InputFormat
+
+from conversion_cache import cached_convert
+from only_docling import build_converter, configure_logging, export_outputs, prepare_pipeline_options
+
+_log = logging.getLogger(__name__)
+
+# One converter per worker process; models are loaded when the worker starts
+# and then reused for every file that worker receives.
+_worker_converter = None
+
+
+@dataclass
+class FileResult:
+    path: str
+    ok: bool
+    pages: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchReport:
+    results: List[FileResult] = field(default_factory=list)
+    wall_seconds: float = 0.0
+
+    @property
+    def succeeded(self) -> List[FileResult]:
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self) -> List[FileResult]:
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def pages(self) -> int:
+        return sum(r.pages for r in self.succeeded)
+
+    @property
+    def docs_per_sec(self) -> float:
+        return len(self.succeeded) / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def pages_per_sec(self) -> float:
+        return self.pages / self.wall_seconds if self.wall_seconds else 0.0
+
+
+def collect_pdfs(inputs: Iterable[str]) -> List[Path]:
+    """
+    Expand a mix of directories and file paths into a sorted list of PDFs.
+    """
+    pdfs = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            pdfs.extend(sorted(p for p in path.iterdir() if p.suffix.lower() == ".pdf"))
+        elif path.exists():
+            pdfs.append(path)
+        else:
+            _log.warning(f"Skipping missing input: {path}")
+    return pdfs
+
+
+def init_worker():
+    """
+    Process-pool initializer: build this worker's converter once.
+    """
+    global _worker_converter
+    configure_logging()
+    _worker_converter = build_converter(prepare_pipeline_options())
+    # Force the pipeline (layout, OCR and table models) to load now rather
+    # than inside the first timed conversion.
+    _worker_converter.initialize_pipeline(InputFormat.PDF)
+
+
+def get_worker_converter():
+    return _worker_converter
+
+
+def _convert_one(pdf_path: str, output_dir: str) -> FileResult:
+    start_time = time.perf_counter()
+    try:
+        conv_result = cached_convert(_worker_converter, Path(pdf_path))
+        document = conv_result.document
+        out_dir = Path(output_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        export_outputs(out_dir, conv_result.input.file.stem, document)
+        return FileResult(
+            path=pdf_path,
+            ok=True,
+            pages=document.num_pages(),
+            seconds=time.perf_counter() - start_time,
+        )
+    except Exception as e:
+        _log.exception(f"Error converting {pdf_path}: {e}")
+        return FileResult(
+            path=pdf_path,
+            ok=False,
+            seconds=time.perf_counter() - start_time,
+            error=f"{type(e).__name__}: {e}",
+        )
+
+
+def convert_batch(pdfs: List[Path], output_dir: Path, workers: Optional[int] = None) -> BatchReport:
+    """
+    Convert every PDF in `pdfs` over a process pool and write the standard
+    exports to `output_dir`. A failing file is recorded in the report and
+    does not stop the rest of the batch.
+    """
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(pdfs) or 1))
+    report = BatchReport()
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        futures = {pool.submit(_convert_one, str(p), str(output_dir)): p for p in pdfs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker itself died (e.g. OOM kill); keep going with the rest.
+                result = FileResult(path=str(futures[future]), ok=False, error=f"{type(e).__name__}: {e}")
+            report.results.append(result)
+            status = "ok" if result.ok else f"FAILED ({result.error})"
+            _log.info(f"[{len(report.results)}/{len(pdfs)}] {result.path}: {status} in {result.seconds:.2f}s")
+    report.wall_seconds = time.perf_counter() - start_time
+    return report
+
+
+def print_report(report: BatchReport):
+    print(f"\n✅ Converted {len(report.succeeded)} documents ({report.pages} pages) in {report.wall_seconds:.2f}s")
+    print(f"   {report.docs_per_sec:.2f} docs/sec, {report.pages_per_sec:.2f} pages/sec")
+    for result in report.failed:
+        print(f"❌ {result.path}: {result.error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-convert PDFs with one warm converter per worker.")
+    parser.add_argument("inputs", nargs="*", default=["input"], help="PDF files or directories (default: input/)")
+    parser.add_argument("-o", "--output-dir", default="output")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    configure_logging()
+    pdfs = collect_pdfs(args.inputs)
+    if not pdfs:
+        _log.error("No PDF files found.")
+        return
+
+    report = convert_batch(pdfs, Path(args.output_dir), args.workers)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
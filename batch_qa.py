@@ -0,0 +1,303 @@
+"""
+Answer many questions against the vector index at once.
+
+    questions -> one embedding batch -> one vectorized FAISS search
+              -> prompts (same "stuff" format, `doc_id` scoping and
+                 `token_budget` packing as get_qa_chain)
+              -> concurrent LLM calls, at most `max_concurrency` in flight
+
+Retrieval results and answers are cached on disk, keyed by the normalized
+question, the index contents, the embedding model and backend, the
+document scope, the token budget, the prompt template and the model, so a
+repeated evaluation run only pays for what changed.
+
+    python batch_qa.py questions.txt --concurrency 8 -o answers.jsonl
+    python batch_qa.py questions.txt --stub --stub-latency 0.5    # offline
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(".qa_cache")
+DOCUMENT_SEPARATOR = "\n\n"
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().lower()
+
+
+def index_identity(index) -> str:
+    """
+    Hash of what the index holds: embedding model, index type, search
+    settings and every document's chunk fingerprint. Unlike the save
+    counter it differs between rebuilt or unrelated index directories.
+    """
+    meta = index.meta
+    documents = sorted((doc_id, entry["fingerprint"]) for doc_id, entry in meta["documents"].items())
+    return QACache.key(meta["model_name"], index.index_factory, meta.get("nprobe"), json.dumps(documents))
+
+
+def embedding_identity(vector_store) -> str:
+    """
+    Name of the model that embeds the questions. CachedEmbeddings names
+    include the backend ("<model>@onnx-int8"), whose vectors differ slightly.
+    """
+    embeddings = vector_store.embedding_function
+    return getattr(embeddings, "model_name", None) or type(embeddings).__name__
+
+
+@dataclass
+class QAResult:
+    question: str
+    answer: Optional[str]
+    sources: List[dict] = field(default_factory=list)
+    retrieval_cached: bool = False
+    answer_cached: bool = False
+    error: Optional[str] = None
+
+
+class QACache:
+    """
+    One small JSON file per key under `cache_dir/<kind>/`.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path] = DEFAULT_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+
+    @staticmethod
+    def key(*parts) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _path(self, kind: str, key: str) -> Path:
+        return self.cache_dir / kind / f"{key}.json"
+
+    def get(self, kind: str, key: str):
+        path = self._path(kind, key)
+        if not path.exists():
+            return None
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def put(self, kind: str, key: str, value):
+        path = self._path(kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(value), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+
+class BatchQA:
+    def __init__(self, vector_store, llm, prompt_template: str, model_name: str, k: int = 3,
+                 max_concurrency: int = 8, index_id: Optional[str] = None, cache: Optional[QACache] = None,
+                 token_budget: Optional[int] = None, doc_id: Optional[str] = None):
+        if cache is not None and not index_id:
+            raise ValueError("index_id is required with a cache; without it unrelated indexes share entries")
+        self.vector_store = vector_store
+        self.llm = llm
+        self.prompt_template = prompt_template
+        self.model_name = model_name
+        self.k = k
+        self.max_concurrency = max_concurrency
+        self.index_id = index_id
+        self.embedding_id = embedding_identity(vector_store)
+        self.cache = cache
+        self.token_budget = token_budget
+        self.doc_id = doc_id
+        self.packer = None
+        if token_budget:
+            from context_packing import ContextPacker
+            self.packer = ContextPacker(token_budget=token_budget)
+        self._positions = None
+
+    @classmethod
+    def from_index(cls, index, llm=None, model_name: Optional[str] = None, **kwargs) -> "BatchQA":
+        from langchain_ollama.llms import OllamaLLM
+
+        from main import QA_MODEL, QA_PROMPT_TEMPLATE
+
+        model_name = model_name or QA_MODEL
+        return cls(index.vector_store, llm or OllamaLLM(model=model_name), QA_PROMPT_TEMPLATE, model_name,
+                   index_id=index_identity(index), cache=QACache(), **kwargs)
+
+    def _embed_questions(self, questions: List[str]) -> np.ndarray:
+        embeddings = self.vector_store.embedding_function
+        # Skip the chunk embedding cache; questions are not corpus chunks.
+        embeddings = getattr(embeddings, "embeddings", embeddings)
+        return np.asarray(embeddings.embed_documents(questions), dtype=np.float32)
+
+    def retrieve(self, questions: List[str]) -> List[List[dict]]:
+        """
+        Top-k chunks for every question from one batched FAISS search,
+        among the chunks of `doc_id` only when it is set. Each hit is
+        {"id", "text", "metadata", "score"}.
+        """
+        if not questions:
+            return []
+        query_vectors = self._embed_questions(questions)
+        if self.doc_id is None:
+            scores, positions = self.vector_store.index.search(query_vectors, self.k)
+        else:
+            from vector_index import document_positions, search_positions
+            if self._positions is None:
+                self._positions = document_positions(self.vector_store, self.doc_id)
+            scores, positions = search_positions(self.vector_store.index, query_vectors, self._positions, self.k)
+        id_map = self.vector_store.index_to_docstore_id
+        docstore = self.vector_store.docstore
+        results = []
+        for row_scores, row_positions in zip(scores, positions):
+            hits = []
+            for score, position in zip(row_scores, row_positions):
+                if position < 0:
+                    continue
+                chunk_id = id_map[int(position)]
+                doc = docstore.search(chunk_id)
+                hits.append({"id": chunk_id, "text": doc.page_content, "metadata": doc.metadata,
+                             "score": float(score)})
+            results.append(hits)
+        return results
+
+    def _prompt(self, question: str, hits: List[dict]) -> str:
+        texts = [hit["text"] for hit in hits]
+        if self.packer:
+            from langchain_core.documents import Document
+            documents = [Document(page_content=hit["text"], metadata=hit["metadata"]) for hit in hits]
+            texts = [d.page_content for d in self.packer.pack(question, documents)]
+        context = DOCUMENT_SEPARATOR.join(texts)
+        return self.prompt_template.format(context=context, question=question)
+
+    def _generate(self, prompts: List[str]) -> list:
+        """
+        One `invoke` per prompt on a thread pool. `BaseLLM.batch` would run
+        each group of prompts through `generate`, which Ollama serves one
+        prompt at a time.
+        """
+        def call(prompt):
+            try:
+                return self.llm.invoke(prompt)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrency, len(prompts)))) as pool:
+            return list(pool.map(call, prompts))
+
+    def answer(self, questions: List[str]) -> List[QAResult]:
+        normalized = [normalize_question(q) for q in questions]
+        results = [QAResult(question=q, answer=None) for q in questions]
+
+        retrieval_keys = [QACache.key("retrieval", n, self.index_id, self.embedding_id, self.doc_id, self.k)
+                          for n in normalized]
+        hits: List[Optional[List[dict]]] = [None] * len(questions)
+        if self.cache:
+            for i, key in enumerate(retrieval_keys):
+                hits[i] = self.cache.get("retrieval", key)
+                results[i].retrieval_cached = hits[i] is not None
+        missing = [i for i, h in enumerate(hits) if h is None]
+        for i, found in zip(missing, self.retrieve([questions[i] for i in missing])):
+            hits[i] = found
+            if self.cache:
+                self.cache.put("retrieval", retrieval_keys[i], found)
+
+        answer_keys = [QACache.key("answer", n, self.index_id, self.embedding_id, self.doc_id, self.token_budget,
+                                   self.prompt_template, self.model_name, self.k) for n in normalized]
+        pending = []
+        for i, result in enumerate(results):
+            result.sources = [{"id": h["id"], "metadata": h["metadata"], "score": h["score"]} for h in hits[i]]
+            cached = self.cache.get("answer", answer_keys[i]) if self.cache else None
+            if cached is not None:
+                result.answer = cached["answer"]
+                result.answer_cached = True
+            else:
+                pending.append(i)
+
+        if pending:
+            start_time = time.perf_counter()
+            prompts = [self._prompt(questions[i], hits[i]) for i in pending]
+            outputs = self._generate(prompts)
+            for i, output in zip(pending, outputs):
+                if isinstance(output, Exception):
+                    results[i].error = f"{type(output).__name__}: {output}"
+                    continue
+                results[i].answer = output
+                if self.cache:
+                    self.cache.put("answer", answer_keys[i], {"question": questions[i], "answer": output})
+            _log.info(f"Generated {len(pending)} answers in {time.perf_counter() - start_time:.2f}s "
+                      f"(concurrency {self.max_concurrency})")
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions (one per line) in batch.")
+    parser.add_argument("questions")
+    parser.add_argument("-o", "--output", help="Write results as JSON lines")
+    parser.add_argument("--index-dir", default="vector_index")
+    parser.add_argument("--model")
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--doc-id", help="Only retrieve chunks of this document")
+    parser.add_argument("--token-budget", type=int, help="Pack each prompt's context to this many tokens")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--stub", action="store_true", help="Answer with the local stub LLM server")
+    parser.add_argument("--stub-latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    from vector_index import PersistentIndex
+
+    logging.basicConfig(level=logging.INFO)
+    questions = [q.strip() for q in Path(args.questions).read_text(encoding="utf-8").splitlines() if q.strip()]
+    index = PersistentIndex.load_or_create(args.index_dir)
+
+    stub = None
+    llm = None
+    if args.stub:
+        from langchain_ollama.llms import OllamaLLM
+
+        from stub_llm import StubLLMServer
+
+        stub = StubLLMServer(latency=args.stub_latency).start()
+        llm = OllamaLLM(model=stub.model, base_url=stub.url)
+    try:
+        qa = BatchQA.from_index(index, llm=llm, model_name=args.model or (stub.model if stub else None),
+                                k=args.k, max_concurrency=args.concurrency, token_budget=args.token_budget,
+                                doc_id=args.doc_id)
+        if args.no_cache:
+            qa.cache = None
+        start_time = time.perf_counter()
+        results = qa.answer(questions)
+        seconds = time.perf_counter() - start_time
+    finally:
+        if stub:
+            stub.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            for result in results:
+                fp.write(json.dumps(asdict(result)) + "\n")
+    answered = sum(1 for r in results if r.answer is not None)
+    cached = sum(1 for r in results if r.answer_cached)
+    print(f"✅ {answered}/{len(results)} answered in {seconds:.2f}s "
+          f"({len(results) / seconds:.1f} questions/s, {cached} from cache)")
+    for result in results:
+        if result.error:
+            print(f"❌ {result.question}: {result.error}")
+
+
+if __name__ == "__main__":
+    main()
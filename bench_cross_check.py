@@ -0,0 +1,62 @@
+import argparse
+import time
+from pathlib import Path
+
+from cross_check import find_best_matches, find_best_matches_bruteforce, load_doctags, load_readme_lines
+
+DEFAULT_PDF = Path("input/deep-leraning-sarker.pdf")
+
+
+def ensure_exports(pdf_path: Path, output_dir: Path):
+    """
+    Convert `pdf_path` (through the conversion cache) if its .md/.doctags
+    exports are not in `output_dir` yet.
+    """
+    md_path = output_dir / f"{pdf_path.stem}.md"
+    doctags_path = output_dir / f"{pdf_path.stem}.doctags"
+    if not (md_path.exists() and doctags_path.exists()):
+        from conversion_cache import cached_convert
+        from only_docling import build_converter, export_outputs, prepare_pipeline_options
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        conv_result = cached_convert(build_converter(prepare_pipeline_options()), pdf_path)
+        export_outputs(output_dir, pdf_path.stem, conv_result.document)
+    return md_path, doctags_path
+
+
+def timed(fn, *args):
+    start_time = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare indexed and brute-force cross_check alignment.")
+    parser.add_argument("pdf", nargs="?", default=str(DEFAULT_PDF))
+    parser.add_argument("--output-dir", default="output")
+    parser.add_argument("--max-lines", type=int, default=None,
+                        help="Only align the first N README lines (the brute-force run is quadratic)")
+    args = parser.parse_args()
+
+    md_path, doctags_path = ensure_exports(Path(args.pdf), Path(args.output_dir))
+    readme_lines = load_readme_lines(md_path)[:args.max_lines]
+    doctag_lines = load_doctags(doctags_path)
+    print(f"{md_path.name}: {len(readme_lines)} README lines x {len(doctag_lines)} doctag lines")
+
+    indexed, indexed_time = timed(find_best_matches, readme_lines, doctag_lines)
+    brute, brute_time = timed(find_best_matches_bruteforce, readme_lines, doctag_lines)
+
+    brute_pairs = {(m[0], m[1], m[4]) for m in brute}
+    indexed_pairs = {(m[0], m[1], m[4]) for m in indexed}
+    agreement = len(brute_pairs & indexed_pairs) / len(brute_pairs) if brute_pairs else 1.0
+
+    print(f"brute force: {brute_time:8.3f}s  {len(brute)} matches")
+    print(f"indexed:     {indexed_time:8.3f}s  {len(indexed)} matches")
+    print(f"speedup:     {brute_time / indexed_time if indexed_time else float('inf'):8.1f}x")
+    print(f"agreement:   {agreement:8.1%} of brute-force matches reproduced")
+    for m in sorted(brute_pairs - indexed_pairs):
+        print(f"  missed: README {m[0]} -> Doctag {m[1]} ({m[2]})")
+
+
+if __name__ == "__main__":
+    main()
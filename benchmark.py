@@ -0,0 +1,244 @@
+"""
+End-to-end benchmark over the input/ corpus.
+
+    python benchmark.py run [--output results.json] [--save-baseline]
+    python benchmark.py compare [baseline.json] results.json [--threshold 0.2]
+
+Every PDF goes through conversion, each export format, both chunkers,
+embedding, FAISS build, retrieval, chunk-to-location matching, cross_check
+alignment and a QA call against the local stub LLM. Each stage records wall
+time, CPU time, peak RSS and pages/sec.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from memory_usage import RssSampler
+
+DEFAULT_RESULTS = Path("benchmarks/results.json")
+DEFAULT_BASELINE = Path("benchmarks/baseline.json")
+QUESTIONS = [
+    "What is the main contribution of this document?",
+    "Which methods are compared?",
+    "Summarize the results.",
+]
+ALL_STAGES = ["convert", "export", "chunk_recursive", "chunk_hybrid", "embed", "faiss_build",
+              "retrieve", "locate", "cross_check", "qa"]
+
+
+class BenchmarkRun:
+    def __init__(self):
+        self.records: List[dict] = []
+
+    @contextmanager
+    def stage(self, pdf: str, name: str, pages: int):
+        """
+        Time one stage. The body may set `record["items"]` (chunks, vectors,
+        queries, ...) for per-item throughput.
+        """
+        record = {"pdf": pdf, "stage": name, "pages": pages, "items": None}
+        cpu_start = time.process_time()
+        start_time = time.perf_counter()
+        with RssSampler(interval=0.01) as sampler:
+            yield record
+        record["wall"] = time.perf_counter() - start_time
+        record["cpu"] = time.process_time() - cpu_start
+        record["peak_rss"] = sampler.peak
+        record["pages_per_sec"] = pages / record["wall"] if record["wall"] and pages else None
+        record["items_per_sec"] = None
+        if record["items"] is not None and record["wall"]:
+            record["items_per_sec"] = record["items"] / record["wall"]
+        self.records.append(record)
+        print(f"  {name:<16} {record['wall']:8.3f}s wall {record['cpu']:8.3f}s cpu "
+              f"{sampler.peak / 1024 ** 2:7.0f} MiB")
+
+
+def _metadata() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "commit": commit,
+    }
+
+
+def run_benchmark(pdfs: List[Path], stages: List[str], profile: str,
+                  embedding_backend: Optional[str] = None, threads: Optional[int] = None) -> dict:
+    from docling.chunking import HybridChunker
+    from docling.datamodel.base_models import InputFormat
+    from langchain.chains import RetrievalQA
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain_community.vectorstores import FAISS
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from langchain_ollama.llms import OllamaLLM
+
+    from chunk_to_location import build_text_index, locate_chunks
+    from cross_check import find_best_matches
+    from pipeline_profiles import ProfileConverter
+    from stream_export import BINARY_SUFFIX, DEFAULT_FORMATS, export_document
+    from stub_llm import StubLLMServer
+    from vector_index import DEFAULT_MODEL_NAME
+
+    run = BenchmarkRun()
+    # Conversion and embedding are measured uncached.
+    converter = ProfileConverter(profile, use_cache=False)
+    converter.converter.initialize_pipeline(InputFormat.PDF)
+    if embedding_backend:
+        from embedding_backends import make_embeddings
+        embeddings = make_embeddings(embedding_backend, DEFAULT_MODEL_NAME, threads=threads)
+    else:
+        embeddings = HuggingFaceEmbeddings(model_name=DEFAULT_MODEL_NAME)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=100)
+    chunker = HybridChunker()
+    export_dir = Path(tempfile.mkdtemp(prefix="bench_exports_"))
+
+    with StubLLMServer() as stub:
+        llm = OllamaLLM(model=stub.model, base_url=stub.url)
+        for pdf_path in pdfs:
+            print(f"{pdf_path.name}")
+            name = pdf_path.name
+            with run.stage(name, "convert", 0) as record:
+                document = converter.convert(pdf_path).document
+            pages = document.num_pages()
+            record["pages"] = pages
+            record["pages_per_sec"] = pages / record["wall"] if record["wall"] else None
+
+            if "export" in stages:
+                for suffix in list(DEFAULT_FORMATS) + [BINARY_SUFFIX]:
+                    with run.stage(name, f"export{suffix}", pages) as record:
+                        stats = export_document(document, export_dir, pdf_path.stem, [suffix])
+                        record["items"] = stats[0].bytes
+
+            markdown = document.export_to_markdown()
+            chunks = splitter.split_text(markdown)
+            if "chunk_recursive" in stages:
+                with run.stage(name, "chunk_recursive", pages) as record:
+                    chunks = splitter.split_text(markdown)
+                    record["items"] = len(chunks)
+            if "chunk_hybrid" in stages:
+                with run.stage(name, "chunk_hybrid", pages) as record:
+                    record["items"] = sum(1 for _ in chunker.chunk(dl_doc=document))
+
+            if not chunks:
+                continue
+            vectors = None
+            if {"embed", "faiss_build", "retrieve", "qa"} & set(stages):
+                with run.stage(name, "embed", pages) as record:
+                    batches_before = len(getattr(embeddings, "batch_seconds", []))
+                    vectors = embeddings.embed_documents(chunks)
+                    record["items"] = len(chunks)
+                if embedding_backend:
+                    batch_ms = [s * 1000 for s in embeddings.batch_seconds[batches_before:]]
+                    record["batches"] = len(batch_ms)
+                    record["batch_ms_max"] = max(batch_ms, default=None)
+                    record["batch_ms_mean"] = sum(batch_ms) / len(batch_ms) if batch_ms else None
+            if vectors is not None:
+                with run.stage(name, "faiss_build", pages) as record:
+                    vector_store = FAISS.from_embeddings(list(zip(chunks, vectors)), embeddings)
+                    record["items"] = len(vectors)
+                if "retrieve" in stages:
+                    with run.stage(name, "retrieve", pages) as record:
+                        for question in QUESTIONS:
+                            vector_store.similarity_search(question, k=3)
+                        record["items"] = len(QUESTIONS)
+                if "qa" in stages:
+                    qa_chain = RetrievalQA.from_chain_type(
+                        llm=llm, chain_type="stuff", retriever=vector_store.as_retriever(search_kwargs={"k": 3}))
+                    with run.stage(name, "qa", pages) as record:
+                        for question in QUESTIONS:
+                            qa_chain.invoke({"query": question})
+                        record["items"] = len(QUESTIONS)
+
+            if "locate" in stages:
+                with run.stage(name, "locate", pages) as record:
+                    locate_chunks(chunks, build_text_index(document))
+                    record["items"] = len(chunks)
+            if "cross_check" in stages:
+                doctags = document.export_to_document_tokens()
+                with run.stage(name, "cross_check", pages) as record:
+                    readme_lines = [line.strip() for line in markdown.splitlines() if line.strip()]
+                    doctag_lines = [line.strip() for line in doctags.splitlines() if line.strip()]
+                    record["items"] = len(find_best_matches(readme_lines, doctag_lines))
+
+    return {"meta": _metadata(), "profile": profile, "embedding_backend": embedding_backend or "huggingface",
+            "results": run.records}
+
+
+def compare_results(baseline: dict, current: dict, threshold: float, min_delta: float) -> List[dict]:
+    """
+    Stages whose wall time grew by more than `threshold` (relative) and
+    `min_delta` seconds (absolute, to ignore noise on tiny stages).
+    """
+    before: Dict[tuple, dict] = {(r["pdf"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+    for record in current["results"]:
+        old = before.get((record["pdf"], record["stage"]))
+        if old is None or not old["wall"]:
+            continue
+        change = (record["wall"] - old["wall"]) / old["wall"]
+        if change > threshold and record["wall"] - old["wall"] > min_delta:
+            regressions.append({"pdf": record["pdf"], "stage": record["stage"],
+                                "baseline": old["wall"], "current": record["wall"], "change": change})
+    return regressions
+
+
+def _write(path: Path, payload: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the PDF -> RAG pipeline over input/.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("--input-dir", default="input")
+    run_parser.add_argument("--output", default=str(DEFAULT_RESULTS))
+    run_parser.add_argument("--stages", nargs="+", default=ALL_STAGES, choices=ALL_STAGES)
+    run_parser.add_argument("--profile", default="accurate")
+    run_parser.add_argument("--embedding-backend", help="torch, torch-int8, onnx or onnx-int8 (default: "
+                            "HuggingFaceEmbeddings)")
+    run_parser.add_argument("--threads", type=int, help="Intra-op threads for --embedding-backend")
+    run_parser.add_argument("--save-baseline", action="store_true", help=f"Also write {DEFAULT_BASELINE}")
+
+    compare_parser = sub.add_parser("compare")
+    compare_parser.add_argument("files", nargs="+", help="[baseline] results")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown to flag")
+    compare_parser.add_argument("--min-delta", type=float, default=0.05, help="Ignore changes under N seconds")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        pdfs = sorted(Path(args.input_dir).glob("*.pdf"))
+        results = run_benchmark(pdfs, args.stages, args.profile, args.embedding_backend, args.threads)
+        _write(Path(args.output), results)
+        if args.save_baseline:
+            _write(DEFAULT_BASELINE, results)
+        print(f"\n✅ Results written to {args.output}")
+        return 0
+
+    baseline_path, current_path = (DEFAULT_BASELINE, args.files[0]) if len(args.files) == 1 else args.files[:2]
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    current = json.loads(Path(current_path).read_text(encoding="utf-8"))
+    regressions = compare_results(baseline, current, args.threshold, args.min_delta)
+    for r in regressions:
+        print(f"❌ {r['pdf']} {r['stage']}: {r['baseline']:.3f}s -> {r['current']:.3f}s (+{r['change']:.0%})")
+    if not regressions:
+        print(f"✅ No stage regressed by more than {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
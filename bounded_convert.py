@@ -0,0 +1,200 @@
+import argparse
+import gc
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import List
+
+from docling_core.types.doc import DoclingDocument
+
+from memory_usage import RssSampler, current_rss, format_bytes, release_memory
+from only_docling import build_converter, configure_logging, export_outputs, prepare_pipeline_options
+from page_parallel import page_count
+from stream_export import TEXT_WRITERS
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 16
+DEFAULT_RSS_CEILING = 3 * 1024 ** 3
+# Formats whose window exports can simply be appended to one another.
+STREAMED_FORMATS = (".md", ".txt")
+
+
+@dataclass
+class WindowStats:
+    first_page: int
+    last_page: int
+    seconds: float
+    peak_rss: int
+    rss_after: int
+
+
+@dataclass
+class MemoryReport:
+    document: str
+    pages: int
+    rss_ceiling: int
+    peak_rss: int = 0
+    # Peak while exporting; also counted in `peak_rss`.
+    export_peak_rss: int = 0
+    windows: List[WindowStats] = field(default_factory=list)
+
+    @property
+    def ceiling_respected(self) -> bool:
+        return self.peak_rss <= self.rss_ceiling
+
+    def record_export(self, peak: int):
+        self.export_peak_rss = max(self.export_peak_rss, peak)
+        self.peak_rss = max(self.peak_rss, peak)
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["ceiling_respected"] = self.ceiling_respected
+        return data
+
+    def summary(self) -> str:
+        sizes = sorted({w.last_page - w.first_page + 1 for w in self.windows})
+        status = "respected" if self.ceiling_respected else "EXCEEDED"
+        return (f"{self.document}: {self.pages} pages in {len(self.windows)} windows (sizes {sizes}), "
+                f"peak RSS {format_bytes(self.peak_rss)}, ceiling {format_bytes(self.rss_ceiling)} {status}")
+
+
+@dataclass
+class BoundedConversion:
+    spill_files: List[Path]
+    report: MemoryReport
+
+    def load_document(self) -> DoclingDocument:
+        """
+        Stitch the spilled windows back into one document. Only do this when
+        the whole document fits in memory; otherwise consume the windows one
+        by one with `iter_windows`.
+        """
+        return DoclingDocument.concatenate(list(self.iter_windows()))
+
+    def iter_windows(self):
+        for path in self.spill_files:
+            yield DoclingDocument.load_from_json(path)
+
+
+def export_windows(conversion: BoundedConversion, output_dir: Path, doc_filename: str,
+                   formats=STREAMED_FORMATS) -> List[Path]:
+    """
+    Write the text exports one window at a time, appending to a single file
+    per format, so at most one window is in memory. RSS is sampled while
+    exporting and recorded on the report.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = [output_dir / f"{doc_filename}{suffix}" for suffix in formats]
+    with RssSampler() as sampler:
+        files = [path.open("w", encoding="utf-8") for path in paths]
+        try:
+            for index, document in enumerate(conversion.iter_windows()):
+                for suffix, fp in zip(formats, files):
+                    if index:
+                        fp.write("\n\n")
+                    TEXT_WRITERS[suffix](document, fp)
+                del document
+                gc.collect()
+        finally:
+            for fp in files:
+                fp.close()
+    conversion.report.record_export(sampler.peak)
+    for path in paths:
+        _log.info(f"Exported {path} ({path.stat().st_size} bytes)")
+    return paths
+
+
+def low_memory_pipeline_options():
+    options = prepare_pipeline_options()
+    # Keep no page or picture bitmaps on the result; they are the bulk of
+    # what a finished page holds on to.
+    options.generate_page_images = False
+    options.generate_picture_images = False
+    return options
+
+
+def convert_bounded(pdf_path: Path, spill_dir: Path, window: int = DEFAULT_WINDOW,
+                    rss_ceiling: int = DEFAULT_RSS_CEILING, converter=None) -> BoundedConversion:
+    """
+    Convert `pdf_path` in windows of at most `window` pages, writing each
+    finished window to `spill_dir` and freeing it before the next one. When
+    RSS goes over `rss_ceiling` the window is halved; it grows back towards
+    `window` while RSS stays well below the ceiling.
+    """
+    pdf_path = Path(pdf_path)
+    spill_dir.mkdir(parents=True, exist_ok=True)
+    converter = converter or build_converter(low_memory_pipeline_options())
+    num_pages = page_count(pdf_path)
+    report = MemoryReport(document=pdf_path.name, pages=num_pages, rss_ceiling=rss_ceiling)
+    spill_files = []
+
+    size = window
+    start = 1
+    while start <= num_pages:
+        end = min(start + size - 1, num_pages)
+        start_time = time.perf_counter()
+        with RssSampler() as sampler:
+            conv_result = converter.convert(pdf_path, page_range=(start, end))
+            spill_path = spill_dir / f"{pdf_path.stem}.p{start:05d}-{end:05d}.json"
+            with spill_path.open("w", encoding="utf-8") as fp:
+                json.dump(conv_result.document.export_to_dict(), fp)
+            # Drop the pages (bitmaps, backends, model predictions) and the
+            # document before touching the next window.
+            conv_result.pages.clear()
+            del conv_result
+            gc.collect()
+            release_memory()
+
+        rss_after = current_rss()
+        report.windows.append(WindowStats(start, end, time.perf_counter() - start_time, sampler.peak, rss_after))
+        report.peak_rss = max(report.peak_rss, sampler.peak)
+        spill_files.append(spill_path)
+        _log.info(f"Pages {start}-{end}: peak {format_bytes(sampler.peak)}, after {format_bytes(rss_after)}")
+
+        if sampler.peak > rss_ceiling and size > 1:
+            size = max(1, size // 2)
+            _log.warning(f"RSS over ceiling, window lowered to {size} pages")
+        elif sampler.peak < rss_ceiling // 2 and size < window:
+            size = min(window, size * 2)
+        start = end + 1
+
+    return BoundedConversion(spill_files=spill_files, report=report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a huge PDF with bounded memory.")
+    parser.add_argument("pdf")
+    parser.add_argument("-o", "--output-dir", default="output")
+    parser.add_argument("--spill-dir", default=None, help="Where finished windows go (default: <output>/<name>.pages)")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Pages per window")
+    parser.add_argument("--rss-ceiling-mb", type=int, default=DEFAULT_RSS_CEILING // 1024 ** 2)
+    parser.add_argument("--no-export", action="store_true", help="Only spill windows, skip the exports")
+    parser.add_argument("--stitch", action="store_true",
+                        help="Also load the whole document to write every export format (needs it to fit in memory)")
+    args = parser.parse_args()
+
+    configure_logging()
+    pdf_path = Path(args.pdf)
+    output_dir = Path(args.output_dir)
+    spill_dir = Path(args.spill_dir) if args.spill_dir else output_dir / f"{pdf_path.stem}.pages"
+
+    conversion = convert_bounded(pdf_path, spill_dir, args.window, args.rss_ceiling_mb * 1024 ** 2)
+    if args.stitch:
+        with RssSampler() as sampler:
+            export_outputs(output_dir, pdf_path.stem, conversion.load_document())
+        conversion.report.record_export(sampler.peak)
+    elif not args.no_export:
+        export_windows(conversion, output_dir, pdf_path.stem)
+
+    report_path = spill_dir / "memory_report.json"
+    report_path.write_text(json.dumps(conversion.report.to_dict(), indent=2), encoding="utf-8")
+
+    print(f"\n{'✅' if conversion.report.ceiling_respected else '⚠️'} {conversion.report.summary()}")
+    print(f"   report written to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,248 @@
-### This will have a function that takes a chunk and returns the exact location of the file 
-### the method will have the input parameter as file_name, and the list that will contain the chunks,
-## this method will return the location of chunk in the pdf and I will use that to feed into the metatdata for the
-## the chunk that later on stored into vector database for RAG purpose.
-### for now I have different outputs that I am generating after extracting the pdf
-# to multiple formats like json, readme, doctags, json and doctags will have the location info,
-# I dont know how to proceed help me to proceed further.
-# help me to give me the method that will do this.
\ No newline at end of file
+"""
+Resolve RAG chunks to their exact location in a converted PDF.
+
+The document text is normalized once into a single string, with a
+character-offset -> (page, bbox, section) map built from each item's `prov`.
+Chunks are then located in bulk against that string through an index of
+word-aligned anchors, so a chunk that spans several docling items still
+resolves, and only the items it actually covers contribute bounding boxes.
+The result is meant to be stored as chunk metadata in the vector database.
+"""
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+ANCHOR_LEN = 32
+MAX_START_ANCHORS = 8
+
+
+def normalize_text(text):
+    # Lowercase, remove excessive whitespace, normalize line breaks
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+@dataclass
+class TextIndex:
+    text: str
+    # Same offsets as `text`, original case, for returning matched text.
+    display: str = ""
+    starts: List[int] = field(default_factory=list)
+    ends: List[int] = field(default_factory=list)
+    # (page_no, l, t, r, b) for every prov of the item
+    provs: List[List[Tuple[int, float, float, float, float]]] = field(default_factory=list)
+    sections: List[Optional[str]] = field(default_factory=list)
+    anchors: Dict[str, List[int]] = field(default_factory=dict)
+
+    def items_between(self, start: int, end: int) -> range:
+        """
+        Indexes of the items whose text overlaps [start, end).
+        """
+        first = bisect_right(self.ends, start)
+        last = bisect_left(self.starts, end)
+        return range(first, last)
+
+
+def _item_text(item) -> str:
+    text = getattr(item, "text", None)
+    if text is not None:
+        return text
+    data = getattr(item, "data", None)
+    if data is not None and getattr(data, "table_cells", None):
+        return " ".join(cell.text for cell in data.table_cells)
+    return ""
+
+
+def build_text_index(document, anchor_len: int = ANCHOR_LEN) -> TextIndex:
+    """
+    Build the normalized full-document text and its offset map from a
+    DoclingDocument.
+    """
+    from docling_core.types.doc import DocItemLabel
+
+    parts = []
+    display_parts = []
+    index = TextIndex(text="")
+    offset = 0
+    section = None
+    for item, _level in document.iterate_items():
+        raw = _item_text(item)
+        text = normalize_text(raw)
+        if not text:
+            continue
+        display = re.sub(r'\s+', ' ', raw).strip()
+        # Lowercasing can change the length of a few characters; keep the
+        # offsets aligned in that case.
+        display_parts.append(display if len(display) == len(text) else text)
+        label = getattr(item, "label", None)
+        if label in (DocItemLabel.SECTION_HEADER, DocItemLabel.TITLE):
+            section = item.text.strip()
+
+        if parts:
+            offset += 1  # joining space
+        parts.append(text)
+        index.starts.append(offset)
+        index.ends.append(offset + len(text))
+        index.provs.append([
+            (prov.page_no, prov.bbox.l, prov.bbox.t, prov.bbox.r, prov.bbox.b)
+            for prov in getattr(item, "prov", [])
+        ])
+        index.sections.append(section)
+        offset += len(text)
+
+    index.text = " ".join(parts)
+    index.display = " ".join(display_parts)
+    index.anchors = _build_anchors(index.text, anchor_len)
+    return index
+
+
+def load_text_index(json_path: Union[str, Path], anchor_len: int = ANCHOR_LEN) -> TextIndex:
+    """
+    Build the index from a `.json` export instead of re-converting the PDF.
+    """
+    from docling_core.types.doc import DoclingDocument
+    return build_text_index(DoclingDocument.load_from_json(Path(json_path)), anchor_len)
+
+
+def _word_starts(text: str) -> Iterable[int]:
+    if text and text[0] != " ":
+        yield 0
+    pos = text.find(" ")
+    while pos != -1:
+        if pos + 1 < len(text):
+            yield pos + 1
+        pos = text.find(" ", pos + 1)
+
+
+def _build_anchors(text: str, anchor_len: int) -> Dict[str, List[int]]:
+    anchors: Dict[str, List[int]] = {}
+    for pos in _word_starts(text):
+        key = text[pos:pos + anchor_len]
+        if len(key) == anchor_len:
+            anchors.setdefault(key, []).append(pos)
+    return anchors
+
+
+def _chunk_anchors(chunk: str, anchor_len: int) -> List[Tuple[int, str]]:
+    return [(pos, chunk[pos:pos + anchor_len]) for pos in _word_starts(chunk)
+            if pos + anchor_len <= len(chunk)]
+
+
+def _find_span(chunk: str, index: TextIndex, anchor_len: int) -> Tuple[Optional[Tuple[int, int]], str]:
+    text = index.text
+    chunk_anchors = _chunk_anchors(chunk, anchor_len)
+
+    # Exact match: any anchor hit that lines up with the whole chunk.
+    for chunk_pos, key in chunk_anchors[:MAX_START_ANCHORS]:
+        for pos in index.anchors.get(key, ()):
+            start = pos - chunk_pos
+            if start >= 0 and text.startswith(chunk, start):
+                return (start, start + len(chunk)), "exact"
+
+    if not chunk_anchors:
+        # Too short for anchors; fall back to a plain scan.
+        start = text.find(chunk)
+        if start != -1:
+            return (start, start + len(chunk)), "exact"
+        return None, "none"
+
+    # Approximate match: the chunk differs somewhere (OCR noise, a different
+    # export). Every anchor hit implies a chunk start; the true one is where
+    # most anchors agree, so a phrase that also occurs elsewhere is outvoted.
+    # The span runs from the first to the last anchor of that group.
+    implied = [(pos - chunk_pos, chunk_pos, pos) for chunk_pos, key in chunk_anchors
+               for pos in index.anchors.get(key, ())]
+    if not implied:
+        return None, "none"
+    votes = Counter(s // anchor_len for s, _, _ in implied)
+    best = max(votes, key=lambda b: (votes[b] + votes[b - 1] + votes[b + 1], -b))
+    group = sorted(s for s, _, _ in implied if abs(s // anchor_len - best) <= 1)
+    center = group[len(group) // 2]
+    tolerance = max(anchor_len, len(chunk) // 4)
+    agreeing = [(chunk_pos, pos) for s, chunk_pos, pos in implied if abs(s - center) <= tolerance]
+    first_chunk_pos, first_pos = min(agreeing)
+    last_chunk_pos, last_pos = max(agreeing)
+    start = max(0, first_pos - first_chunk_pos)
+    end = min(last_pos + (len(chunk) - last_chunk_pos), len(text))
+    if end <= start:
+        return None, "none"
+    return (start, end), "approximate"
+
+
+def _empty_location() -> dict:
+    return {
+        "matched_text": "",
+        "pages": [],
+        "bounding_boxes": [],
+        "section_headers": [],
+        "char_start": None,
+        "char_end": None,
+        "match": "none",
+    }
+
+
+def locate_span(index: TextIndex, start: int, end: int) -> dict:
+    """
+    Pages, bounding boxes and section headers of the items covering the
+    normalized text range [start, end).
+    """
+    pages = set()
+    bboxes = []
+    sections = []
+    for i in index.items_between(start, end):
+        for page_no, l, t, r, b in index.provs[i]:
+            pages.add(page_no)
+            bboxes.append({
+                "page_no": page_no,
+                "bbox": {"l": l, "t": t, "r": r, "b": b},
+                "item_span": (max(start, index.starts[i]) - index.starts[i],
+                              min(end, index.ends[i]) - index.starts[i]),
+            })
+        section = index.sections[i]
+        if section and section not in sections:
+            sections.append(section)
+    return {
+        "matched_text": (index.display or index.text)[start:end],
+        "pages": sorted(pages),
+        "bounding_boxes": bboxes,
+        "section_headers": sections,
+        "char_start": start,
+        "char_end": end,
+    }
+
+
+def locate_chunks(chunks: Iterable[str], index: TextIndex, anchor_len: int = ANCHOR_LEN) -> List[dict]:
+    """
+    Locate every chunk in one pass over the prebuilt index. Each result has
+    the keys returned by `match_chunks_to_pdf` plus the character span in the
+    normalized document text and whether the match was exact.
+    """
+    results = []
+    for chunk in chunks:
+        norm_chunk = normalize_text(chunk)
+        span, quality = _find_span(norm_chunk, index, anchor_len) if norm_chunk else (None, "none")
+        if span is None:
+            results.append(_empty_location())
+            continue
+        location = locate_span(index, *span)
+        location["match"] = quality
+        results.append(location)
+    return results
+
+
+def chunk_to_location(file_name: Union[str, Path], chunks: List[str]) -> List[dict]:
+    """
+    Locations of `chunks` in `file_name`, which may be a PDF (converted
+    through the conversion cache) or a docling `.json` export.
+    """
+    path = Path(file_name)
+    if path.suffix.lower() == ".json":
+        return locate_chunks(chunks, load_text_index(path))
+
+    from conversion_cache import cached_convert
+    from only_docling import build_converter, prepare_pipeline_options
+
+    conv_result = cached_convert(build_converter(prepare_pipeline_options()), path)
+    return locate_chunks(chunks, build_text_index(conv_result.document))
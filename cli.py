@@ -0,0 +1,209 @@
+"""
+Single entry point for the pipeline scripts.
+
+    python cli.py convert input/sample-1.pdf --profile fast
+    python cli.py export output/sample-1.json --formats md txt
+    python cli.py index output/sample-1.md
+    python cli.py query "What is this document about?"
+    python cli.py locate output/sample-1.json chunks.json
+    python cli.py cross-check output/sample-1.md output/sample-1.doctags
+    python cli.py startup
+
+Only the standard library is imported at module level; docling, langchain,
+torch and FAISS are imported inside the subcommand that needs them, so
+`--help` and the light subcommands start quickly. `startup` measures that.
+"""
+import argparse
+import json
+import logging
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+SUBCOMMANDS = ("convert", "export", "index", "query", "locate", "cross-check")
+# Modules whose import cost `startup --imports` reports.
+HEAVY_MODULES = ("docling.document_converter", "docling_core.types.doc", "langchain_community.vectorstores",
+                 "langchain_huggingface", "langchain_ollama", "faiss", "torch")
+
+
+def _formats(values: Optional[List[str]]) -> Optional[List[str]]:
+    return [v if v.startswith(".") else f".{v}" for v in values] if values else None
+
+
+def cmd_convert(args):
+    from pipeline_profiles import ProfileConverter
+    from stream_export import DEFAULT_FORMATS, export_document, print_stats
+
+    pdf_path = Path(args.pdf)
+    result = ProfileConverter(args.profile, use_cache=not args.no_cache).convert(pdf_path)
+    stats = export_document(result.document, Path(args.output_dir), pdf_path.stem,
+                            _formats(args.formats) or DEFAULT_FORMATS)
+    print_stats(stats)
+    print(f"✅ Converted {pdf_path.name} ({result.document.num_pages()} pages)")
+
+
+def cmd_export(args):
+    from stream_export import BINARY_SUFFIX, DEFAULT_FORMATS, export_document, load_binary, print_stats
+
+    source = Path(args.source)
+    if source.suffix == BINARY_SUFFIX:
+        document = load_binary(source)
+    else:
+        from docling_core.types.doc import DoclingDocument
+        document = DoclingDocument.load_from_json(source)
+    print_stats(export_document(document, Path(args.output_dir), source.stem,
+                                _formats(args.formats) or DEFAULT_FORMATS))
+
+
+def _read_markdown(path: Path) -> str:
+    if path.suffix == ".json":
+        from docling_core.types.doc import DoclingDocument
+        return DoclingDocument.load_from_json(path).export_to_markdown()
+    return path.read_text(encoding="utf-8")
+
+
+def cmd_index(args):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    from vector_index import PersistentIndex
+
+    source = Path(args.source)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    chunks = splitter.split_text(_read_markdown(source))
+    index = PersistentIndex.load_or_create(Path(args.index_dir))
+    index.add_document(args.doc_id or source.stem, chunks)
+    index.save()
+    print(f"✅ {len(chunks)} chunks from {source.name} in {args.index_dir} (version {index.version})")
+
+
+def cmd_query(args):
+    from main import get_qa_chain
+    from vector_index import PersistentIndex
+
+    index = PersistentIndex.load_or_create(Path(args.index_dir))
+    response = get_qa_chain(index.vector_store, token_budget=args.token_budget).invoke({"query": args.question})
+    print(f"\n🧠 Answer: {response['result']}")
+    for doc in response["source_documents"]:
+        print(f"  - {doc.metadata.get('doc_id')}: {doc.page_content[:80]!r}")
+
+
+def _read_chunks(path: Path) -> List[str]:
+    """
+    A JSON list of strings, or plain text with chunks separated by blank lines.
+    """
+    text = path.read_text(encoding="utf-8")
+    if path.suffix == ".json":
+        return json.loads(text)
+    return [c.strip() for c in text.split("\n\n") if c.strip()]
+
+
+def cmd_locate(args):
+    from chunk_to_location import chunk_to_location
+
+    locations = chunk_to_location(args.document, _read_chunks(Path(args.chunks)))
+    output = json.dumps(locations, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+        print(f"✅ Locations written to {args.output}")
+    else:
+        print(output)
+
+
+def cmd_cross_check(args):
+    from cross_check import find_best_matches, load_doctags, load_readme_lines, print_matches
+
+    matches = find_best_matches(load_readme_lines(args.readme), load_doctags(args.doctags), threshold=args.threshold)
+    print_matches(matches)
+    print(f"\n{len(matches)} matching lines")
+
+
+def _time_command(command: List[str], runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings)
+
+
+def cmd_startup(args):
+    """
+    Median wall time of fresh `cli.py ... --help` processes, and with
+    --imports the cost of importing each heavy dependency on its own.
+    """
+    script = str(Path(__file__).resolve())
+    baseline = _time_command([sys.executable, "-c", "pass"], args.runs)
+    print(f"{'python -c pass':<28} {baseline * 1000:8.1f} ms")
+    for argv in [["--help"]] + [[name, "--help"] for name in SUBCOMMANDS]:
+        seconds = _time_command([sys.executable, script] + argv, args.runs)
+        print(f"{'cli.py ' + ' '.join(argv):<28} {seconds * 1000:8.1f} ms")
+    if args.imports:
+        print()
+        for module in HEAVY_MODULES:
+            seconds = _time_command([sys.executable, "-c", f"import {module}"], args.runs)
+            print(f"{'import ' + module:<40} {(seconds - baseline) * 1000:8.1f} ms")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="PDF -> RAG pipeline.")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("convert", help="Convert a PDF and write its exports")
+    p.add_argument("pdf")
+    p.add_argument("-o", "--output-dir", default="output")
+    p.add_argument("--profile", default="accurate", choices=["fast", "balanced", "accurate"])
+    p.add_argument("--formats", nargs="+")
+    p.add_argument("--no-cache", action="store_true")
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser("export", help="Re-export a converted .json or .dlb document")
+    p.add_argument("source")
+    p.add_argument("-o", "--output-dir", default="output")
+    p.add_argument("--formats", nargs="+")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("index", help="Chunk a .md or docling .json export into the vector index")
+    p.add_argument("source")
+    p.add_argument("--doc-id")
+    p.add_argument("--index-dir", default="vector_index")
+    p.add_argument("--chunk-size", type=int, default=2000)
+    p.add_argument("--chunk-overlap", type=int, default=100)
+    p.set_defaults(func=cmd_index)
+
+    p = sub.add_parser("query", help="Ask a question against the vector index")
+    p.add_argument("question")
+    p.add_argument("--index-dir", default="vector_index")
+    p.add_argument("--token-budget", type=int, help="Pack the retrieved context into this many tokens")
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser("locate", help="Find the pages and boxes of chunks in a PDF or docling .json")
+    p.add_argument("document")
+    p.add_argument("chunks", help="JSON list of chunks, or text with blank-line separated chunks")
+    p.add_argument("-o", "--output")
+    p.set_defaults(func=cmd_locate)
+
+    p = sub.add_parser("cross-check", help="Align Markdown lines with doctags lines")
+    p.add_argument("readme")
+    p.add_argument("doctags")
+    p.add_argument("--threshold", type=float, default=0.8)
+    p.set_defaults(func=cmd_cross_check)
+
+    p = sub.add_parser("startup", help="Measure CLI start-up and import times")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--imports", action="store_true", help="Also time each heavy import")
+    p.set_defaults(func=cmd_startup)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Token-budgeted context for the "stuff" QA chain.
+
+Retrieved chunks overlap (the splitter repeats chunk_overlap characters
+between neighbours) and often repeat each other. The packer splits them into
+sentences, drops exact and near-duplicate sentences, scores the rest
+against the question, and keeps the best ones until `token_budget` is
+reached; the best sentence that no longer fits is cut down to the tokens
+left, when at least MIN_TRUNCATED_TOKENS are left, so a long table or list
+is shortened rather than lost. Kept sentences
+stay in their original chunk and order, joined by the whitespace that
+separated them, so the prompt still reads naturally.
+
+`PackedRetriever` wraps a retriever and is what `get_qa_chain(...,
+token_budget=N)` uses. `python context_packing.py questions.txt` compares
+prompt tokens, time to first token and answer agreement with and without
+packing.
+"""
+import argparse
+import logging
+import math
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from tracing import current_span
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_BUDGET = 1024
+NEAR_DUPLICATE = 0.8
+# Fewer tokens than this left over are not worth a sentence fragment.
+MIN_TRUNCATED_TOKENS = 8
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])|\n{2,}")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_WORD = re.compile(r"\w+")
+
+
+def approx_tokens(text: str) -> int:
+    """
+    Words plus punctuation marks; close to what a BPE tokenizer produces
+    for English prose, and free to compute.
+    """
+    return len(_TOKEN.findall(text))
+
+
+def _split_with_separators(text: str) -> List[Tuple[str, str]]:
+    """
+    (separator, sentence) pairs, where the separator is the original
+    whitespace before the sentence ("" for the first one).
+    """
+    pieces = []
+    start = 0
+    separator = ""
+    for match in list(_SENTENCE_END.finditer(text)) + [None]:
+        end = match.start() if match else len(text)
+        raw = text[start:end]
+        sentence = raw.strip()
+        if sentence:
+            pieces.append((separator + raw[:len(raw) - len(raw.lstrip())], sentence))
+            separator = raw[len(raw.rstrip()):]
+        else:
+            separator += raw
+        if match:
+            separator += match.group()
+            start = match.end()
+    return pieces
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for _, sentence in _split_with_separators(text)]
+
+
+def _shingles(words: List[str], n: int = 3) -> set:
+    if len(words) < n:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+@dataclass
+class PackingStats:
+    original_tokens: int = 0
+    packed_tokens: int = 0
+    sentences: int = 0
+    kept: int = 0
+    duplicates: int = 0
+    truncated: int = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.packed_tokens
+
+
+@dataclass
+class _Sentence:
+    doc: int
+    position: int
+    text: str
+    words: List[str]
+    tokens: int
+    separator: str = " "
+    score: float = 0.0
+
+
+@dataclass
+class ContextPacker:
+    token_budget: int = DEFAULT_TOKEN_BUDGET
+    near_duplicate: float = NEAR_DUPLICATE
+    # Weight of the retriever's ranking against lexical relevance.
+    rank_weight: float = 0.5
+    count_tokens: Callable[[str], int] = approx_tokens
+    last_stats: PackingStats = field(default_factory=PackingStats)
+
+    def __post_init__(self):
+        if self.token_budget <= 0:
+            raise ValueError(f"token_budget must be positive, got {self.token_budget}")
+
+    def _sentences(self, documents: List[Document], stats: PackingStats) -> List[_Sentence]:
+        """
+        Sentences of every document, without exact or near-duplicate
+        repeats. The first occurrence (from the higher-ranked chunk) wins.
+        """
+        kept: List[_Sentence] = []
+        seen_exact = set()
+        seen_shingles: List[set] = []
+        for doc_index, document in enumerate(documents):
+            for position, (separator, text) in enumerate(_split_with_separators(document.page_content)):
+                stats.sentences += 1
+                words = [w.lower() for w in _WORD.findall(text)]
+                key = " ".join(words)
+                if not key or key in seen_exact:
+                    stats.duplicates += 1
+                    continue
+                shingles = _shingles(words)
+                # Overlap regions usually cut a sentence in half; a fragment
+                # contained in an earlier sentence is a duplicate too.
+                if any(len(shingles & other) / min(len(shingles), len(other)) >= self.near_duplicate
+                       for other in seen_shingles if other):
+                    stats.duplicates += 1
+                    continue
+                seen_exact.add(key)
+                seen_shingles.append(shingles)
+                kept.append(_Sentence(doc_index, position, text, words, self.count_tokens(text), separator or " "))
+        return kept
+
+    def _score(self, question: str, sentences: List[_Sentence]):
+        query = set(w.lower() for w in _WORD.findall(question))
+        df = Counter(w for s in sentences for w in set(s.words))
+        total = len(sentences) or 1
+        for s in sentences:
+            counts = Counter(s.words)
+            lexical = sum(math.log(1 + total / df[w]) * (1 + math.log(counts[w])) for w in query if counts[w])
+            lexical /= math.sqrt(len(s.words) or 1)
+            s.score = lexical + self.rank_weight / (1 + s.doc)
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Longest prefix of `text`, cut at a token boundary, that
+        `count_tokens` puts at `max_tokens` or fewer.
+        """
+        ends = [m.end() for m in _TOKEN.finditer(text)]
+        n = min(max_tokens, len(ends))
+        while n > 0:
+            prefix = text[:ends[n - 1]]
+            if self.count_tokens(prefix) <= max_tokens:
+                return prefix
+            n -= max(1, n // 10)
+        return ""
+
+    def pack(self, question: str, documents: List[Document]) -> List[Document]:
+        """
+        Documents trimmed to the best sentences that fit the budget. A
+        document that loses every sentence is dropped, but some context is
+        always kept when any document has text, even with a budget smaller
+        than MIN_TRUNCATED_TOKENS.
+        """
+        stats = PackingStats(original_tokens=sum(self.count_tokens(d.page_content) for d in documents))
+        sentences = self._sentences(documents, stats)
+        self._score(question, sentences)
+
+        chosen = []
+        skipped = []
+        used = 0
+        for s in sorted(sentences, key=lambda s: (-s.score, s.doc, s.position)):
+            if used + s.tokens > self.token_budget:
+                skipped.append(s)
+                continue
+            chosen.append(s)
+            used += s.tokens
+        # Fill what is left with the start of the best sentence that did not
+        # fit, unless only a few tokens are left and there is other context.
+        remaining = self.token_budget - used
+        if skipped and (remaining >= MIN_TRUNCATED_TOKENS or not chosen):
+            best = skipped[0]
+            text = self._truncate(best.text, remaining)
+            if text:
+                best.text, best.tokens = text, self.count_tokens(text)
+                chosen.append(best)
+                stats.truncated += 1
+
+        packed = []
+        for doc_index, document in enumerate(documents):
+            kept = sorted((s for s in chosen if s.doc == doc_index), key=lambda s: s.position)
+            if kept:
+                content = kept[0].text + "".join(s.separator + s.text for s in kept[1:])
+                packed.append(Document(page_content=content, metadata=dict(document.metadata)))
+        stats.kept = len(chosen)
+        stats.packed_tokens = sum(self.count_tokens(d.page_content) for d in packed)
+        self.last_stats = stats
+        current_span().set(prompt_tokens=stats.packed_tokens, prompt_tokens_saved=stats.saved_tokens)
+        _log.info(f"Packed context: {stats.original_tokens} -> {stats.packed_tokens} tokens "
+                  f"({stats.duplicates} duplicate sentences dropped)")
+        return packed
+
+
+class PackedRetriever(BaseRetriever):
+    """
+    Retriever wrapper returning the packed form of the base retriever's
+    documents.
+    """
+    base_retriever: BaseRetriever
+    packer: ContextPacker
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        documents = self.base_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return self.packer.pack(query, documents)
+
+
+def _token_f1(candidate: str, reference: str) -> float:
+    cand, ref = Counter(_WORD.findall(candidate.lower())), Counter(_WORD.findall(reference.lower()))
+    overlap = sum((cand & ref).values())
+    if not overlap:
+        return 0.0
+    precision, recall = overlap / sum(cand.values()), overlap / sum(ref.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def _stream_answer(llm, prompt: str):
+    start_time = time.perf_counter()
+    first = None
+    pieces = []
+    for piece in llm.stream(prompt):
+        if first is None:
+            first = time.perf_counter() - start_time
+        pieces.append(piece)
+    return "".join(pieces), first, time.perf_counter() - start_time
+
+
+def evaluate(questions: List[str], retriever, llm, prompt_template: str, packer: ContextPacker) -> List[dict]:
+    """
+    Answer every question with the full and the packed context and record
+    prompt tokens, time to first token and token F1 between the answers.
+    """
+    rows = []
+    for question in questions:
+        documents = retriever.invoke(question)
+        full_prompt = prompt_template.format(context="\n\n".join(d.page_content for d in documents),
+                                             question=question)
+        packed = packer.pack(question, documents)
+        packed_prompt = prompt_template.format(context="\n\n".join(d.page_content for d in packed),
+                                               question=question)
+        full_answer, full_ttft, full_total = _stream_answer(llm, full_prompt)
+        packed_answer, packed_ttft, packed_total = _stream_answer(llm, packed_prompt)
+        rows.append({
+            "question": question,
+            "prompt_tokens": approx_tokens(full_prompt),
+            "packed_prompt_tokens": approx_tokens(packed_prompt),
+            "ttft": full_ttft,
+            "packed_ttft": packed_ttft,
+            "seconds": full_total,
+            "packed_seconds": packed_total,
+            "answer_f1": round(_token_f1(packed_answer, full_answer), 4),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full and token-budgeted QA context.")
+    parser.add_argument("questions", help="One question per line")
+    parser.add_argument("--index-dir", default="vector_index")
+    parser.add_argument("--budget", type=int, default=DEFAULT_TOKEN_BUDGET)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--stub", action="store_true", help="Use the local stub LLM server")
+    args = parser.parse_args()
+
+    from langchain_ollama.llms import OllamaLLM
+
+    from main import QA_MODEL, QA_PROMPT_TEMPLATE
+    from vector_index import PersistentIndex
+
+    logging.basicConfig(level=logging.WARNING)
+    questions = [q.strip() for q in Path(args.questions).read_text(encoding="utf-8").splitlines() if q.strip()]
+    retriever = PersistentIndex.load_or_create(args.index_dir).as_retriever(search_kwargs={"k": args.k})
+    packer = ContextPacker(token_budget=args.budget)
+
+    stub = None
+    if args.stub:
+        from stub_llm import StubLLMServer
+        stub = StubLLMServer().start()
+    try:
+        llm = OllamaLLM(model=stub.model, base_url=stub.url) if stub else OllamaLLM(model=QA_MODEL)
+        rows = evaluate(questions, retriever, llm, QA_PROMPT_TEMPLATE, packer)
+    finally:
+        if stub:
+            stub.stop()
+
+    for row in rows:
+        print(f"{row['prompt_tokens']:6d} -> {row['packed_prompt_tokens']:6d} tokens  "
+              f"TTFT {row['ttft']:.2f}s -> {row['packed_ttft']:.2f}s  F1 {row['answer_f1']:.2f}  {row['question'][:60]}")
+    if rows:
+        saved = sum(r["prompt_tokens"] - r["packed_prompt_tokens"] for r in rows) / len(rows)
+        print(f"\n✅ {saved:.0f} prompt tokens saved per query on average")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+from importlib import metadata
+from pathlib import Path
+from typing import Optional, Union
+
+from docling.datamodel.base_models import ConversionStatus, InputFormat
+from docling.document_converter import DocumentConverter
+from docling_core.types.doc import DoclingDocument
+
+from tracing import current_span
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(".docling_cache")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+@dataclass
+class CachedInput:
+    file: Path
+
+
+@dataclass
+class CachedConversionResult:
+    """
+    Stand-in for docling's ConversionResult when the document comes from the
+    cache. Exposes the attributes the scripts here rely on.
+    """
+    input: CachedInput
+    document: DoclingDocument
+    status: ConversionStatus = ConversionStatus.SUCCESS
+    from_cache: bool = True
+
+
+def file_digest(path: Union[str, Path], block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def converter_fingerprint(converter: DocumentConverter) -> str:
+    """
+    Hash of everything that changes the converted output: the PDF pipeline
+    options (OCR, table structure, cell matching, ...), the backend class and
+    the installed docling version.
+    """
+    format_option = converter.format_to_options[InputFormat.PDF]
+    backend = format_option.backend
+    parts = {
+        "pipeline_options": json.loads(format_option.pipeline_options.model_dump_json()),
+        "backend": f"{backend.__module__}.{backend.__qualname__}",
+        "docling": metadata.version("docling"),
+    }
+    encoded = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class ConversionCache:
+    """
+    On-disk cache of converted documents keyed by PDF content hash and
+    converter fingerprint. Entries are evicted least-recently-used once the
+    cache grows past `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path] = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, digest: str, fingerprint: str) -> Path:
+        return self.cache_dir / f"{digest}-{fingerprint}.json"
+
+    def get(self, pdf_path: Path, fingerprint: str, digest: Optional[str] = None) -> Optional[CachedConversionResult]:
+        entry = self._entry_path(digest or file_digest(pdf_path), fingerprint)
+        if not entry.exists():
+            return None
+        try:
+            document = DoclingDocument.model_validate(json.loads(entry.read_text(encoding="utf-8")))
+        except Exception as e:
+            _log.warning(f"Discarding unreadable cache entry {entry}: {e}")
+            entry.unlink(missing_ok=True)
+            return None
+        # Touch the entry so eviction sees it as recently used.
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            pass
+        return CachedConversionResult(input=CachedInput(file=pdf_path), document=document)
+
+    def put(self, pdf_path: Path, fingerprint: str, document: DoclingDocument, digest: Optional[str] = None):
+        entry = self._entry_path(digest or file_digest(pdf_path), fingerprint)
+        tmp_path = entry.with_name(f"{entry.stem}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(document.export_to_dict()), encoding="utf-8")
+        os.replace(tmp_path, entry)
+        self._evict()
+
+    def convert(self, converter: DocumentConverter, source: Union[str, Path], fingerprint: Optional[str] = None):
+        """
+        Return the cached conversion for `source` or convert it with
+        `converter` and store the result. With an explicit `fingerprint`,
+        `converter` can be anything with a docling-like `convert(path)`.
+        """
+        pdf_path = Path(source)
+        # Hash the PDF once; a miss needs the same key again for put().
+        digest = file_digest(pdf_path)
+        fingerprint = fingerprint or converter_fingerprint(converter)
+        cached = self.get(pdf_path, fingerprint, digest)
+        if cached is not None:
+            self.hits += 1
+            current_span().set(conversion_cache="hit")
+            _log.info(f"Conversion cache hit for {pdf_path}")
+            return cached
+
+        self.misses += 1
+        current_span().set(conversion_cache="miss")
+        result = converter.convert(pdf_path)
+        if result.status == ConversionStatus.SUCCESS:
+            self.put(pdf_path, fingerprint, result.document, digest)
+        return result
+
+    def _entries(self):
+        """
+        (path, stat) of every entry. Other processes evict concurrently, so
+        entries that vanish between glob and stat are skipped.
+        """
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                entries.append((path, path.stat()))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(st.st_size for _, st in entries)
+        if total <= self.max_bytes:
+            return
+        for path, st in sorted(entries, key=lambda e: e[1].st_mtime):
+            path.unlink(missing_ok=True)
+            total -= st.st_size
+            _log.info(f"Evicted {path.name} from conversion cache")
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        for path in self.cache_dir.glob("*.json"):
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(entries),
+            "bytes": sum(st.st_size for _, st in entries),
+        }
+
+
+_default_cache: Optional[ConversionCache] = None
+
+
+def get_default_cache() -> ConversionCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ConversionCache(os.environ.get("DOCLING_CACHE_DIR", DEFAULT_CACHE_DIR))
+    return _default_cache
+
+
+def cached_convert(converter: DocumentConverter, source: Union[str, Path], cache: Optional[ConversionCache] = None,
+                   fingerprint: Optional[str] = None):
+    """
+    Drop-in replacement for `converter.convert(source)` that goes through the
+    conversion cache.
+    """
+    return (cache or get_default_cache()).convert(converter, source, fingerprint)
@@ -1,62 +1,158 @@
+import io
 import os
 import re
+from collections import namedtuple
 
-def parse_doctags(content: str) -> str:
+TAG_PATTERN = re.compile(r"<(/?)(\w+)(?:\s[^>]*)?>")
+LOC_PATTERN = re.compile(r"loc_(\d+)")
+# Wrapper elements that never produce Markdown of their own; skipping them
+# lets blocks be emitted as soon as each top-level element closes.
+CONTAINER_TAGS = {"doctag", "document"}
+READ_SIZE = 1 << 16
+MAX_TAG_LENGTH = 4096
+
+DoctagsBlock = namedtuple("DoctagsBlock", ["tag", "markdown", "locs"])
+
+
+def render_tag(tag: str, content: str) -> str:
+    if tag == "section_header_level_1":
+        return f"# {content}"
+    elif tag == "section_header_level_2":
+        return f"## {content}"
+    elif tag == "text":
+        return content
+    elif tag == "caption":
+        return f"_{content}_"
+    elif tag == "page_break":
+        return "---"
+    elif tag == "unordered_list":
+        return content
+    elif tag == "list_item":
+        return f"- {content}"
+    elif tag == "picture":
+        return ""  # Placeholder for images
+    elif tag == "page_footer":
+        return ""  # Skip footers
+    else:
+        # Default fallback
+        return content
+
+
+def tokenize_doctags(fp, read_size: int = READ_SIZE):
+    """
+    Yield ("text", str), ("open", tag) and ("close", tag) tokens from a file
+    object, reading it incrementally. Other markup is dropped, like the
+    residual tag cleanup used to do.
+    """
+    buf = ""
+    while True:
+        data = fp.read(read_size)
+        buf += data
+        pos = 0
+        while pos < len(buf):
+            lt = buf.find("<", pos)
+            if lt == -1:
+                yield "text", buf[pos:]
+                pos = len(buf)
+                break
+            if lt > pos:
+                yield "text", buf[pos:lt]
+            gt = buf.find(">", lt)
+            if gt == -1:
+                if data and len(buf) - lt < MAX_TAG_LENGTH:
+                    pos = lt  # tag continues in the next read
+                    break
+                yield "text", "<"  # stray '<' that never closes
+                pos = lt + 1
+                continue
+            if buf.find("<", lt + 1, gt) != -1:
+                yield "text", "<"  # literal '<' in the text
+                pos = lt + 1
+                continue
+            match = TAG_PATTERN.fullmatch(buf, lt, gt + 1)
+            if match:
+                yield ("close" if match.group(1) else "open"), match.group(2)
+            pos = gt + 1
+        buf = buf[pos:]
+        if not data:
+            if buf:
+                yield "text", buf
+            return
+
+
+def iter_doctags_blocks(fp, read_size: int = READ_SIZE):
     """
-    Recursively parse doctags content and convert to Markdown.
+    Stack-based single pass over a doctags stream. Yields a DoctagsBlock for
+    every top-level element (tag, rendered Markdown, the `<loc_*>` values seen
+    inside it) and for text between elements (tag None).
     """
-    tag_pattern = re.compile(r"<(?P<tag>\w+)(?:\s[^>]*)?>(?P<content>.*?)</\1>", re.DOTALL)
-
-    def replace_tag(match):
-        tag = match.group("tag")
-        inner_content = match.group("content").strip()
-        # Recursively process inner content
-        processed_content = parse_doctags(inner_content)
-
-        if tag == "section_header_level_1":
-            return f"# {processed_content}"
-        elif tag == "section_header_level_2":
-            return f"## {processed_content}"
-        elif tag == "text":
-            return processed_content
-        elif tag == "caption":
-            return f"_{processed_content}_"
-        elif tag == "page_break":
-            return "---"
-        elif tag == "unordered_list":
-            return processed_content
-        elif tag == "list_item":
-            return f"- {processed_content}"
-        elif tag == "picture":
-            return ""  # Placeholder for images
-        elif tag == "page_footer":
-            return ""  # Skip footers
+    # Each frame is [tag, rendered parts, loc values]; frame 0 is the root.
+    stack = [[None, [], []]]
+    for kind, value in tokenize_doctags(fp, read_size):
+        if kind == "text":
+            if len(stack) == 1:
+                yield DoctagsBlock(None, value, [])
+            else:
+                stack[-1][1].append(value)
+        elif kind == "open":
+            loc = LOC_PATTERN.fullmatch(value)
+            if loc:
+                stack[-1][2].append(int(loc.group(1)))
+            elif value not in CONTAINER_TAGS:
+                stack.append([value, [], []])
         else:
-            # Default fallback
-            return processed_content
+            depth = len(stack) - 1
+            while depth > 0 and stack[depth][0] != value:
+                depth -= 1
+            if depth == 0:
+                continue  # close tag without an open one
+            # Elements left open inside this one (e.g. <nl>, <ecel>) only
+            # contribute their content.
+            while len(stack) - 1 > depth:
+                _, parts, locs = stack.pop()
+                stack[-1][1].extend(parts)
+                stack[-1][2].extend(locs)
+            tag, parts, locs = stack.pop()
+            markdown = render_tag(tag, "".join(parts).strip())
+            if len(stack) == 1:
+                yield DoctagsBlock(tag, markdown, locs)
+            else:
+                stack[-1][1].append(markdown)
+                stack[-1][2].extend(locs)
 
-    # Process all tags recursively
-    while True:
-        content, count = tag_pattern.subn(replace_tag, content)
-        if count == 0:
-            break
+    # Unclosed elements at end of input: keep their content.
+    for tag, parts, locs in stack[1:]:
+        yield DoctagsBlock(tag, "".join(parts), locs)
 
-    return content
 
-def parse_doctags_file(doctags_path: str) -> str:
-    with open(doctags_path, "r", encoding="utf-8") as f:
-        content = f.read()
+def iter_markdown_lines(blocks):
+    """
+    Stripped, non-empty Markdown lines from a block stream; a line may be
+    assembled from several consecutive blocks.
+    """
+    pending = ""
+    for block in blocks:
+        lines = (pending + block.markdown).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield line
+    pending = pending.strip()
+    if pending:
+        yield pending
 
-    markdown_content = parse_doctags(content)
 
-    # Remove any remaining tags
-    residual_tag_pattern = re.compile(r"<[^>]+>")
-    markdown_content = residual_tag_pattern.sub("", markdown_content)
+def parse_doctags(content: str) -> str:
+    """
+    Convert doctags content to Markdown.
+    """
+    return "".join(block.markdown for block in iter_doctags_blocks(io.StringIO(content)))
+
 
-    # Normalize whitespace
-    lines = [line.strip() for line in markdown_content.splitlines()]
-    markdown_lines = [line for line in lines if line]
-    return "\n\n".join(markdown_lines)
+def parse_doctags_file(doctags_path: str) -> str:
+    with open(doctags_path, "r", encoding="utf-8") as f:
+        return "\n\n".join(iter_markdown_lines(iter_doctags_blocks(f)))
 
 def main():
     base_dir = os.path.dirname(os.path.abspath(__file__))
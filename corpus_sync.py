@@ -0,0 +1,211 @@
+"""
+Keep output/ and the vector index in step with input/, doing only the work
+the changes require.
+
+A manifest in the output directory records, for every PDF, its size, mtime
+and content hash and whether it was fully processed. On each sync:
+
+    new or modified PDFs     converted, exported and (re-)indexed
+    removed PDFs             exports deleted, vectors removed
+    unchanged PDFs           skipped (hashed again only if size/mtime moved)
+
+The manifest is rewritten after every document, and a document is marked
+pending before any work starts on it, so an interrupted sync picks up where
+it stopped. The vector index is saved before the document is marked done.
+
+    python corpus_sync.py                 # one sync of input/
+    python corpus_sync.py --watch 60      # poll every 60 seconds
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from conversion_cache import file_digest
+
+_log = logging.getLogger(__name__)
+
+MANIFEST_FILE = ".sync_manifest.json"
+PENDING = "pending"
+DONE = "done"
+
+
+@dataclass
+class SyncReport:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def work(self) -> int:
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+
+class Manifest:
+    def __init__(self, path: Path):
+        self.path = path
+        self.files: Dict[str, dict] = {}
+        if path.exists():
+            self.files = json.loads(path.read_text(encoding="utf-8")).get("files", {})
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps({"files": self.files}, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+
+def doc_id_for(rel_path: str) -> str:
+    return str(Path(rel_path).with_suffix("")).replace(os.sep, "/")
+
+
+def export_name(doc_id: str) -> str:
+    return doc_id.replace("/", "__")
+
+
+class CorpusSync:
+    def __init__(self, input_dir: Path = Path("input"), output_dir: Path = Path("output"),
+                 index_dir: Optional[Path] = None, profile: Optional[str] = None):
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir)
+        self.index_dir = index_dir
+        self.profile = profile
+        self.manifest = Manifest(self.output_dir / MANIFEST_FILE)
+        self._converter = None
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            from vector_index import DEFAULT_INDEX_DIR, PersistentIndex
+            self._index = PersistentIndex.load_or_create(self.index_dir or DEFAULT_INDEX_DIR)
+        return self._index
+
+    @property
+    def converter(self):
+        if self._converter is None:
+            from pipeline_profiles import DEFAULT_PROFILE, ProfileConverter
+            self._converter = ProfileConverter(self.profile or DEFAULT_PROFILE)
+        return self._converter
+
+    def scan(self) -> Dict[str, os.stat_result]:
+        return {str(p.relative_to(self.input_dir)): p.stat()
+                for p in sorted(self.input_dir.rglob("*")) if p.suffix.lower() == ".pdf" and p.is_file()}
+
+    def _needs_work(self, rel_path: str, st: os.stat_result) -> bool:
+        entry = self.manifest.files.get(rel_path)
+        if entry is None or entry["state"] != DONE:
+            return True
+        if entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            return False
+        # Touched but possibly identical (copied, re-downloaded): compare content.
+        digest = file_digest(self.input_dir / rel_path)
+        if digest == entry["sha256"]:
+            entry["mtime"] = st.st_mtime
+            return False
+        return True
+
+    def _remove_outputs(self, doc_id: str):
+        from stream_export import BINARY_SUFFIX, DEFAULT_FORMATS
+
+        for suffix in list(DEFAULT_FORMATS) + [BINARY_SUFFIX]:
+            (self.output_dir / f"{export_name(doc_id)}{suffix}").unlink(missing_ok=True)
+        if self.index.delete_document(doc_id):
+            self.index.save()
+
+    def _process(self, rel_path: str, st: os.stat_result):
+        from provenance_chunks import index_document
+        from stream_export import export_document
+
+        pdf_path = self.input_dir / rel_path
+        doc_id = doc_id_for(rel_path)
+        self.manifest.files[rel_path] = {"sha256": file_digest(pdf_path), "size": st.st_size,
+                                         "mtime": st.st_mtime, "doc_id": doc_id, "state": PENDING}
+        self.manifest.save()
+
+        document = self.converter.convert(pdf_path).document
+        export_document(document, self.output_dir, export_name(doc_id))
+        index_document(self.index, doc_id, document)
+        self.index.save()
+
+        self.manifest.files[rel_path]["state"] = DONE
+        self.manifest.save()
+
+    def sync(self) -> SyncReport:
+        start_time = time.perf_counter()
+        report = SyncReport()
+        current = self.scan()
+
+        for rel_path in sorted(set(self.manifest.files) - set(current)):
+            doc_id = self.manifest.files[rel_path]["doc_id"]
+            try:
+                self._remove_outputs(doc_id)
+            except Exception as e:
+                _log.exception(f"Failed to remove {rel_path}")
+                report.failed[rel_path] = f"{type(e).__name__}: {e}"
+                continue
+            del self.manifest.files[rel_path]
+            self.manifest.save()
+            report.removed.append(rel_path)
+            _log.info(f"Removed {rel_path}")
+
+        for rel_path, st in current.items():
+            if not self._needs_work(rel_path, st):
+                report.unchanged += 1
+                continue
+            is_new = rel_path not in self.manifest.files
+            try:
+                self._process(rel_path, st)
+            except Exception as e:
+                _log.exception(f"Failed to sync {rel_path}")
+                report.failed[rel_path] = f"{type(e).__name__}: {e}"
+                continue
+            (report.added if is_new else report.changed).append(rel_path)
+            _log.info(f"{'Added' if is_new else 'Updated'} {rel_path}")
+
+        # Persist mtime refreshes of unchanged files.
+        self.manifest.save()
+        report.seconds = time.perf_counter() - start_time
+        return report
+
+
+def print_report(report: SyncReport):
+    print(f"✅ Sync done in {report.seconds:.2f}s: {len(report.added)} added, {len(report.changed)} changed, "
+          f"{len(report.removed)} removed, {report.unchanged} unchanged")
+    for rel_path, error in report.failed.items():
+        print(f"❌ {rel_path}: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync output/ and the vector index with the PDFs in input/.")
+    parser.add_argument("--input-dir", default="input")
+    parser.add_argument("--output-dir", default="output")
+    parser.add_argument("--index-dir")
+    parser.add_argument("--profile")
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="Keep polling at this interval")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    syncer = CorpusSync(Path(args.input_dir), Path(args.output_dir),
+                        Path(args.index_dir) if args.index_dir else None, args.profile)
+    while True:
+        report = syncer.sync()
+        if report.work or report.failed or not args.watch:
+            print_report(report)
+        if not args.watch:
+            return
+        try:
+            time.sleep(args.watch)
+        except KeyboardInterrupt:
+            return
+
+
+if __name__ == "__main__":
+    main()
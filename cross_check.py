@@ -1,5 +1,6 @@
 import difflib
 import os
+from collections import defaultdict
 
 def load_readme_lines(filepath):
     with open(filepath, 'r', encoding='utf-8') as f:
@@ -9,7 +10,11 @@ def load_doctags(filepath):
     with open(filepath, 'r', encoding='utf-8') as f:
         return [line.strip() for line in f if line.strip()]
 
-def find_best_matches(readme_lines, doctag_lines, threshold=0.8):
+def find_best_matches_bruteforce(readme_lines, doctag_lines, threshold=0.8):
+    """
+    Reference implementation: scores every README line against every doctag
+    line. Quadratic, kept for benchmarking and verification.
+    """
     matches = []
 
     for i, readme_line in enumerate(readme_lines, start=1):
@@ -25,6 +30,74 @@ def find_best_matches(readme_lines, doctag_lines, threshold=0.8):
 
     return matches
 
+def _ngrams(text, n):
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[k:k + n] for k in range(len(text) - n + 1)}
+
+class NgramIndex:
+    """
+    Character n-gram inverted index over the doctag lines, used to pick a
+    small candidate set before running the exact SequenceMatcher score.
+    """
+
+    def __init__(self, lines, n=3):
+        self.n = n
+        self.sizes = []
+        self.postings = defaultdict(list)
+        for j, line in enumerate(lines):
+            grams = _ngrams(line, n)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(j)
+
+    def candidates(self, line, top_k):
+        grams = _ngrams(line, self.n)
+        shared = defaultdict(int)
+        for gram in grams:
+            for j in self.postings.get(gram, ()):
+                shared[j] += 1
+        # Dice coefficient over n-gram sets.
+        scored = [(2.0 * count / (len(grams) + self.sizes[j]), j) for j, count in shared.items()]
+        scored.sort(reverse=True)
+        return [j for _, j in scored[:top_k]]
+
+def find_best_matches(readme_lines, doctag_lines, threshold=0.8, top_k=10, window=2, n=3):
+    """
+    Same result shape and threshold as `find_best_matches_bruteforce`, but
+    only the `top_k` n-gram candidates (plus the `window` lines following the
+    previous match, since both files are mostly in the same order) get an
+    exact SequenceMatcher score.
+    """
+    index = NgramIndex(doctag_lines, n)
+    matches = []
+    last_j = -1
+    matcher = difflib.SequenceMatcher(None)
+
+    for i, readme_line in enumerate(readme_lines, start=1):
+        candidates = set(index.candidates(readme_line, top_k))
+        if last_j >= 0:
+            candidates.update(range(last_j + 1, min(last_j + 1 + window, len(doctag_lines))))
+
+        best_score = 0
+        best_j = -1
+        matcher.set_seq1(readme_line)
+        # Ascending order keeps the brute-force tie-break (first best line wins).
+        for j in sorted(candidates):
+            matcher.set_seq2(doctag_lines[j])
+            # Cheap upper bounds first; skip lines that cannot beat the best.
+            if matcher.real_quick_ratio() <= best_score or matcher.quick_ratio() <= best_score:
+                continue
+            score = matcher.ratio()
+            if score > best_score:
+                best_score = score
+                best_j = j + 1
+        if best_score >= threshold:
+            last_j = best_j - 1
+            matches.append((i, best_j, readme_line, doctag_lines[best_j - 1], round(best_score, 3)))
+
+    return matches
+
 def print_matches(matches):
     for readme_idx, doctag_idx, readme_line, doctag_line, score in matches:
         print(f"\nREADME Line {readme_idx} → Doctag Line {doctag_idx} (Score: {score})")
@@ -1,29 +1,30 @@
 import os
 from typing import List
 from docling.document_converter import DocumentConverter
+from conversion_cache import cached_convert
 from langchain_ollama.llms import OllamaLLM
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 
+from vector_index import DEFAULT_INDEX_DIR, PersistentIndex, make_retriever
+
 # Get the project root directory
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 
 def extract_pdf_content(file_path) -> str:
     converter = DocumentConverter()
-    result = converter.convert(file_path)
+    result = cached_convert(converter, file_path)
     return result.document.export_to_markdown()
 
-def create_vector_store(texts: List[str]) -> FAISS:
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L12-v2"
-    )
-    vector_store = FAISS.from_texts(texts, embeddings)
-    return vector_store
+def create_vector_store(texts: List[str], doc_id: str = "default") -> FAISS:
+    index = PersistentIndex.load_or_create(DEFAULT_INDEX_DIR)
+    index.add_document(doc_id, texts)
+    index.save()
+    return index.vector_store
 
-def get_qa_chain(vector_store):
+def get_qa_chain(vector_store, doc_id=None):
     # Updated model name from "llama3.1" to "llama3"
     llm = OllamaLLM(model="llama3")
 
@@ -49,7 +50,7 @@ def get_qa_chain(vector_store):
     qa_chain = RetrievalQA.from_chain_type(
         llm=llm,
         chain_type="stuff",
-        retriever=vector_store.as_retriever(search_kwargs={"k": 3}),
+        retriever=make_retriever(vector_store, 3, doc_id),
         chain_type_kwargs={"prompt": PROMPT},
         return_source_documents=True,
     )
@@ -69,8 +70,9 @@ def main():
     )
     text_chunks = text_splitter.split_text(structured_content)
 
-    vector_store = create_vector_store(text_chunks)
-    qa_chain = get_qa_chain(vector_store)
+    doc_id = os.path.splitext(os.path.basename(file_path))[0]
+    vector_store = create_vector_store(text_chunks, doc_id=doc_id)
+    qa_chain = get_qa_chain(vector_store, doc_id=doc_id)
 
     question = "What is Embodied Intelligence?"  # Customize this
     print(f"\nQuestion: {question}")
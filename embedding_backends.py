@@ -0,0 +1,309 @@
+"""
+CPU embedding backends for the MiniLM model, selectable by name:
+
+    torch       sentence-transformers in float32 (the reference)
+    torch-int8  the same model with its Linear layers dynamically quantized to int8
+    onnx        exported ONNX graph run by onnxruntime with full graph optimization
+    onnx-int8   the ONNX graph with int8 dynamically quantized weights
+
+All backends batch by length: texts are sorted by token count and packed so
+each batch stays under `batch_tokens` padded tokens (and `max_batch_size`
+texts), which keeps padding low and lets short chunks go in large batches.
+`threads` sets the intra-op thread count. Every backend records its
+per-batch latency, for `benchmark.py --embedding-backend`.
+
+`python embedding_backends.py compare --backend onnx-int8 output/*.md`
+reports cosine drift and retrieval overlap against the torch reference.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import DEFAULT_MODEL_NAME
+
+_log = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+DEFAULT_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+ONNX_DIR = Path(".onnx_models")
+SBERT_CONFIG = "sentence_bert_config.json"
+
+
+def length_batches(lengths: List[int], batch_tokens: int, max_batch_size: int) -> List[List[int]]:
+    """
+    Indexes grouped into batches of similar length. A batch is closed once
+    (texts in it) x (its longest text) would exceed `batch_tokens`.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches, batch, longest = [], [], 0
+    for i in order:
+        candidate_longest = max(longest, lengths[i])
+        if batch and (candidate_longest * (len(batch) + 1) > batch_tokens or len(batch) >= max_batch_size):
+            batches.append(batch)
+            batch, candidate_longest = [], lengths[i]
+        batch.append(i)
+        longest = candidate_longest
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class BucketedEmbeddings(Embeddings, ABC):
+    """
+    Shared batching and timing; subclasses implement `_token_lengths` and
+    `_encode` (a list of texts -> float32 array).
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, threads: Optional[int] = None,
+                 batch_tokens: int = 8192, max_batch_size: int = 256):
+        self.model_name = model_name
+        self.threads = threads
+        self.batch_tokens = batch_tokens
+        self.max_batch_size = max_batch_size
+        self.batch_seconds: List[float] = []
+        self.batch_sizes: List[int] = []
+
+    @abstractmethod
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        ...
+
+    @abstractmethod
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        ...
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        vectors = None
+        for batch in length_batches(self._token_lengths(texts), self.batch_tokens, self.max_batch_size):
+            start_time = time.perf_counter()
+            encoded = self._encode([texts[i] for i in batch])
+            self.batch_seconds.append(time.perf_counter() - start_time)
+            self.batch_sizes.append(len(batch))
+            if vectors is None:
+                vectors = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+            vectors[batch] = encoded
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+    def batch_stats(self) -> dict:
+        if not self.batch_seconds:
+            return {"batches": 0}
+        seconds = np.asarray(self.batch_seconds)
+        return {
+            "batches": len(seconds),
+            "texts": int(sum(self.batch_sizes)),
+            "texts_per_sec": float(sum(self.batch_sizes) / seconds.sum()) if seconds.sum() else None,
+            "batch_ms_p50": float(np.percentile(seconds, 50) * 1000),
+            "batch_ms_p95": float(np.percentile(seconds, 95) * 1000),
+        }
+
+
+class TorchEmbeddings(BucketedEmbeddings):
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, quantize: bool = False, **kwargs):
+        super().__init__(model_name, **kwargs)
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        if quantize:
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        limit = self.model.max_seq_length
+        encoded = self.model.tokenizer(texts, add_special_tokens=True, truncation=True, max_length=limit)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True).astype(np.float32)
+
+
+def _slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+def export_onnx(model_name: str = DEFAULT_MODEL_NAME, quantize: bool = False, onnx_dir: Path = ONNX_DIR) -> Path:
+    """
+    Export the transformer to ONNX once (and its int8 variant), cached
+    under `onnx_dir`.
+    """
+    target_dir = Path(onnx_dir) / _slug(model_name)
+    fp32_path = target_dir / "model.onnx"
+    int8_path = target_dir / "model-int8.onnx"
+    if not fp32_path.exists():
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        target_dir.mkdir(parents=True, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(["export probe"], return_tensors="pt")
+        names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+        dynamic = {n: {0: "batch", 1: "sequence"} for n in names}
+        dynamic["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(model, tuple(sample[n] for n in names), str(fp32_path), input_names=names,
+                              output_names=["last_hidden_state"], dynamic_axes=dynamic, opset_version=14)
+        tokenizer.save_pretrained(str(target_dir))
+        _log.info(f"Exported {model_name} to {fp32_path}")
+    if quantize and not int8_path.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+        _log.info(f"Quantized {fp32_path.name} to {int8_path}")
+    return int8_path if quantize else fp32_path
+
+
+def _max_seq_length(model_name: str, model_dir: Path, tokenizer) -> int:
+    """
+    The truncation length sentence-transformers uses for `model_name`:
+    max_seq_length from its sentence_bert_config.json (copied next to the
+    export on first use), else the tokenizer's model_max_length.
+    """
+    config_path = model_dir / SBERT_CONFIG
+    if not config_path.exists():
+        try:
+            local = Path(model_name) / SBERT_CONFIG
+            if local.exists():
+                source = local
+            else:
+                from huggingface_hub import hf_hub_download
+                source = Path(hf_hub_download(model_name, SBERT_CONFIG))
+            shutil.copyfile(source, config_path)
+        except Exception as e:
+            _log.warning(f"No {SBERT_CONFIG} for {model_name} ({e}); using the tokenizer's limit")
+    if config_path.exists():
+        return int(json.loads(config_path.read_text(encoding="utf-8"))["max_seq_length"])
+    limit = tokenizer.model_max_length
+    # Tokenizers without a limit report a huge sentinel value.
+    return limit if limit and limit < 100_000 else 512
+
+
+class OnnxEmbeddings(BucketedEmbeddings):
+    """
+    Mean pooling and L2 normalization as in the model's sentence-transformers
+    pipeline. `max_length` defaults to its max_seq_length, so texts are
+    truncated exactly as by the torch reference.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, quantize: bool = False,
+                 max_length: Optional[int] = None, onnx_dir: Path = ONNX_DIR, **kwargs):
+        super().__init__(model_name, **kwargs)
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = export_onnx(model_name, quantize, onnx_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_path.parent))
+        self.max_length = max_length or _max_seq_length(model_name, model_path.parent, self.tokenizer)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length,
+                                 return_tensors="np")
+        feeds = {k: v.astype(np.int64) for k, v in encoded.items() if k in self.input_names}
+        hidden = self.session.run(["last_hidden_state"], feeds)[0]
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return (pooled / np.linalg.norm(pooled, axis=1, keepdims=True).clip(1e-12)).astype(np.float32)
+
+
+def make_embeddings(backend: str = DEFAULT_BACKEND, model_name: str = DEFAULT_MODEL_NAME,
+                    threads: Optional[int] = None, batch_tokens: int = 8192) -> BucketedEmbeddings:
+    kwargs = {"threads": threads, "batch_tokens": batch_tokens}
+    if backend == "torch":
+        return TorchEmbeddings(model_name, **kwargs)
+    if backend == "torch-int8":
+        return TorchEmbeddings(model_name, quantize=True, **kwargs)
+    if backend == "onnx":
+        return OnnxEmbeddings(model_name, **kwargs)
+    if backend == "onnx-int8":
+        return OnnxEmbeddings(model_name, quantize=True, **kwargs)
+    raise ValueError(f"Unknown embedding backend {backend!r}; choose from {BACKENDS}")
+
+
+def compare_backends(reference: Embeddings, candidate: Embeddings, texts: List[str],
+                     queries: Optional[List[str]] = None, k: int = 10) -> dict:
+    """
+    Cosine similarity between the two backends' vectors for the same texts,
+    and how much of the reference top-k each query retrieves with the
+    candidate. Queries default to the first sentence of every 10th text.
+    """
+    def timed(embeddings):
+        start_time = time.perf_counter()
+        vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+        return vectors, time.perf_counter() - start_time
+
+    def unit(vectors):
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True).clip(1e-12)
+
+    ref_vectors, ref_seconds = timed(reference)
+    cand_vectors, cand_seconds = timed(candidate)
+    cand_batches = candidate.batch_stats() if hasattr(candidate, "batch_stats") else None
+    cosine = (unit(ref_vectors) * unit(cand_vectors)).sum(axis=1)
+
+    queries = queries or [t.split(". ")[0] for t in texts[::10]]
+    k = min(k, len(texts))
+    ref_q = unit(np.asarray(reference.embed_documents(queries), dtype=np.float32))
+    cand_q = unit(np.asarray(candidate.embed_documents(queries), dtype=np.float32))
+    ref_top = np.argsort(-ref_q @ unit(ref_vectors).T, axis=1)[:, :k]
+    cand_top = np.argsort(-cand_q @ unit(cand_vectors).T, axis=1)[:, :k]
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]
+
+    return {
+        "texts": len(texts),
+        "cosine_mean": float(cosine.mean()),
+        "cosine_min": float(cosine.min()),
+        f"overlap@{k}": float(np.mean(overlap)),
+        "reference_texts_per_sec": len(texts) / ref_seconds if ref_seconds else None,
+        "candidate_texts_per_sec": len(texts) / cand_seconds if cand_seconds else None,
+        "candidate_batches": cand_batches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an embedding backend with the torch reference.")
+    parser.add_argument("command", choices=["compare"])
+    parser.add_argument("sources", nargs="+", help="Markdown/text files to chunk and embed")
+    parser.add_argument("--backend", default="onnx-int8", choices=BACKENDS)
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--batch-tokens", type=int, default=8192)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    logging.basicConfig(level=logging.INFO)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=100)
+    texts = [c for path in args.sources for c in splitter.split_text(Path(path).read_text(encoding="utf-8"))]
+    reference = make_embeddings("torch", threads=args.threads, batch_tokens=args.batch_tokens)
+    candidate = make_embeddings(args.backend, threads=args.threads, batch_tokens=args.batch_tokens)
+    report = compare_backends(reference, candidate, texts, k=args.k)
+    for key, value in report.items():
+        print(f"{key:<26} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Union
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from tracing import current_span
+
+_log = logging.getLogger(__name__)
+
+# Lives here rather than in vector_index so that modules needing only the
+# model name do not import faiss and langchain_community.
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L12-v2"
+DEFAULT_CACHE_DIR = Path(".embedding_cache")
+KEY_SIZE = 16
+
+
+def normalize_chunk(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+class EmbeddingStore:
+    """
+    Append-only on-disk matrix of embeddings. Row i of `vectors.bin` belongs
+    to the i-th 16-byte key in `keys.bin`; rows are read through a memory map.
+    """
+
+    def __init__(self, store_dir: Union[str, Path], dimension: int, dtype: str = "float16"):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.store_dir / "vectors.bin"
+        self.keys_path = self.store_dir / "keys.bin"
+        meta_path = self.store_dir / "meta.json"
+
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta["dimension"] != dimension:
+                raise ValueError(f"Embedding store {store_dir} has dimension {meta['dimension']}, expected {dimension}")
+            dtype = meta["dtype"]
+        else:
+            meta_path.write_text(json.dumps({"dimension": dimension, "dtype": dtype}), encoding="utf-8")
+
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.row_bytes = self.dimension * self.dtype.itemsize
+        self._rows: Dict[bytes, int] = {}
+        self._matrix = None
+        self._load_keys()
+
+    def _load_keys(self):
+        keys = self.keys_path.read_bytes() if self.keys_path.exists() else b""
+        vector_rows = self.vectors_path.stat().st_size // self.row_bytes if self.vectors_path.exists() else 0
+        # An interrupted append can leave one side longer than the other;
+        # only rows present in both files are trusted.
+        rows = min(len(keys) // KEY_SIZE, vector_rows)
+        self._rows = {keys[i * KEY_SIZE:(i + 1) * KEY_SIZE]: i for i in range(rows)}
+        self._truncate(rows)
+
+    def _truncate(self, rows: int):
+        for path, size in ((self.keys_path, rows * KEY_SIZE), (self.vectors_path, rows * self.row_bytes)):
+            if path.exists() and path.stat().st_size != size:
+                with path.open("r+b") as fp:
+                    fp.truncate(size)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_row(self, key: bytes):
+        return self._rows.get(key)
+
+    def matrix(self) -> np.ndarray:
+        rows = len(self._rows)
+        if self._matrix is None or self._matrix.shape[0] != rows:
+            if rows == 0:
+                return np.empty((0, self.dimension), dtype=self.dtype)
+            self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dimension))
+        return self._matrix
+
+    def append(self, keys: List[bytes], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        start = len(self._rows)
+        with self.vectors_path.open("ab") as fp:
+            fp.write(vectors.tobytes())
+        with self.keys_path.open("ab") as fp:
+            fp.write(b"".join(keys))
+        for offset, key in enumerate(keys):
+            self._rows[key] = start + offset
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that caches document vectors by (model, normalized
+    chunk hash). Only cache misses reach the wrapped model, deduplicated and
+    encoded in batches of `batch_size`.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache_dir: Union[str, Path] = DEFAULT_CACHE_DIR,
+                 batch_size: int = 64, dtype: str = "float16"):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache_dir = Path(cache_dir)
+        self.batch_size = batch_size
+        self.dtype = dtype
+        self.hits = 0
+        self.misses = 0
+        self._store = None
+        self._lock = threading.Lock()
+
+        meta_path = self.cache_dir / _slug(model_name) / "meta.json"
+        if meta_path.exists():
+            self._get_store(json.loads(meta_path.read_text(encoding="utf-8"))["dimension"])
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.blake2b(normalize_chunk(text).encode("utf-8"), digest_size=KEY_SIZE,
+                               person=b"chunk-emb").digest()
+
+    def _get_store(self, dimension: int) -> EmbeddingStore:
+        if self._store is None:
+            self._store = EmbeddingStore(self.cache_dir / _slug(self.model_name), dimension, self.dtype)
+        return self._store
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # The lock only guards the store; model inference runs outside it so
+        # several threads can encode at once.
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            store = self._store
+            pending: Dict[bytes, str] = {}
+            for key, text in zip(keys, texts):
+                if (store is None or store.get_row(key) is None) and key not in pending:
+                    pending[key] = text
+            self.misses += len(pending)
+            self.hits += len(texts) - len(pending)
+        current_span().add("embedding_cache_hits", len(texts) - len(pending))
+        current_span().add("embedding_cache_misses", len(pending))
+
+        pending_keys = list(pending)
+        for start in range(0, len(pending_keys), self.batch_size):
+            batch_keys = pending_keys[start:start + self.batch_size]
+            vectors = np.asarray(self.embeddings.embed_documents([pending[k] for k in batch_keys]),
+                                 dtype=np.float32)
+            with self._lock:
+                store = self._get_store(vectors.shape[1])
+                # Another thread may have encoded the same chunks meanwhile.
+                new = [i for i, key in enumerate(batch_keys) if store.get_row(key) is None]
+                if new:
+                    store.append([batch_keys[i] for i in new], vectors[new])
+
+        with self._lock:
+            store = self._store
+            if store is None:
+                return []
+            matrix = store.matrix()
+            rows = [store.get_row(key) for key in keys]
+            return matrix[rows].astype(np.float32).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "cached_vectors": len(self._store) if self._store else 0,
+        }
@@ -1,9 +1,11 @@
 import os
 from docling.document_converter import DocumentConverter
 
+from conversion_cache import cached_convert
+
 def extract_pdf_content(file_path: str) -> str:
     converter = DocumentConverter()
-    result = converter.convert(file_path)
+    result = cached_convert(converter, file_path)
     return result.document.export_to_markdown()
 
 def main():
@@ -0,0 +1,249 @@
+"""
+Columnar spatial index over the location data in docling exports.
+
+Every provenance box of every item becomes one row in a set of NumPy
+columns (page_no, l/t/r/b, item type, text offsets). Rows are sorted by
+page and then top coordinate so each page is a contiguous slice, and all
+queries are vectorized over those slices.
+"""
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from convert_to_readme import CONTAINER_TAGS, LOC_PATTERN, tokenize_doctags
+
+COLLECTIONS = ("texts", "tables", "pictures", "key_value_items", "form_items")
+
+
+class LayoutIndex:
+    def __init__(self, page_no: np.ndarray, boxes: np.ndarray, item_type: np.ndarray,
+                 text_start: np.ndarray, text_end: np.ndarray, text: str, labels: List[str],
+                 coords: str = "page"):
+        order = np.lexsort((boxes[:, 1], page_no))
+        self.page_no = np.ascontiguousarray(page_no[order], dtype=np.int32)
+        self.l, self.t, self.r, self.b = (np.ascontiguousarray(boxes[order, k], dtype=np.float32) for k in range(4))
+        self.item_type = np.ascontiguousarray(item_type[order], dtype=np.uint8)
+        self.text_start = np.ascontiguousarray(text_start[order], dtype=np.int64)
+        self.text_end = np.ascontiguousarray(text_end[order], dtype=np.int64)
+        self.text = text
+        self.labels = labels
+        # "page" for PDF points with a top-left origin, "loc" for the 0-500
+        # doctags grid.
+        self.coords = coords
+
+        self.pages = np.unique(self.page_no)
+        self._page_start = np.searchsorted(self.page_no, self.pages, side="left")
+        self._page_end = np.searchsorted(self.page_no, self.pages, side="right")
+        self._by_text = np.argsort(self.text_start, kind="stable")
+        self._sorted_text_start = self.text_start[self._by_text]
+
+    def __len__(self) -> int:
+        return len(self.page_no)
+
+    def page_slice(self, page_no: int) -> slice:
+        k = np.searchsorted(self.pages, page_no)
+        if k == len(self.pages) or self.pages[k] != page_no:
+            return slice(0, 0)
+        return slice(int(self._page_start[k]), int(self._page_end[k]))
+
+    def on_page(self, page_no: int) -> np.ndarray:
+        """
+        Row ids of everything on `page_no`, top to bottom.
+        """
+        rows = self.page_slice(page_no)
+        return np.arange(rows.start, rows.stop)
+
+    def overlapping(self, page_no: int, l: float, t: float, r: float, b: float) -> np.ndarray:
+        """
+        Row ids of the boxes on `page_no` that intersect the region l/t/r/b.
+        """
+        rows = self.page_slice(page_no)
+        mask = ((self.l[rows] < r) & (self.r[rows] > l) & (self.t[rows] < b) & (self.b[rows] > t))
+        return np.flatnonzero(mask) + rows.start
+
+    def covering(self, start: int, end: int) -> np.ndarray:
+        """
+        Row ids whose text overlaps the offset range [start, end), in text order.
+        """
+        prefix = np.searchsorted(self._sorted_text_start, end, side="left")
+        candidates = self._by_text[:prefix]
+        return candidates[self.text_end[candidates] > start]
+
+    def boxes(self, rows: np.ndarray) -> np.ndarray:
+        return np.stack([self.page_no[rows], self.l[rows], self.t[rows], self.r[rows], self.b[rows]], axis=1)
+
+    def label(self, row: int) -> str:
+        return self.labels[self.item_type[row]]
+
+    def text_of(self, row: int) -> str:
+        return self.text[self.text_start[row]:self.text_end[row]]
+
+    def save(self, path: Union[str, Path]):
+        np.savez(
+            path,
+            page_no=self.page_no,
+            boxes=np.stack([self.l, self.t, self.r, self.b], axis=1),
+            item_type=self.item_type,
+            text_start=self.text_start,
+            text_end=self.text_end,
+            text=np.frombuffer(self.text.encode("utf-8"), dtype=np.uint8),
+            labels=np.array(self.labels),
+            coords=np.array(self.coords),
+        )
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "LayoutIndex":
+        with np.load(path) as data:
+            return cls(
+                data["page_no"], data["boxes"], data["item_type"], data["text_start"], data["text_end"],
+                data["text"].tobytes().decode("utf-8"), [str(x) for x in data["labels"]], str(data["coords"]),
+            )
+
+
+class _Builder:
+    def __init__(self):
+        self.page_no: List[int] = []
+        self.boxes: List[Tuple[float, float, float, float]] = []
+        self.item_type: List[int] = []
+        self.text_start: List[int] = []
+        self.text_end: List[int] = []
+        self.parts: List[str] = []
+        self.offset = 0
+        self.labels: Dict[str, int] = {}
+
+    def add_text(self, text: str) -> int:
+        if self.parts:
+            self.parts.append("\n")
+            self.offset += 1
+        start = self.offset
+        self.parts.append(text)
+        self.offset += len(text)
+        return start
+
+    def add_box(self, page_no: int, box, label: str, start: int, end: int):
+        self.page_no.append(page_no)
+        self.boxes.append(box)
+        self.item_type.append(self.labels.setdefault(label, len(self.labels)))
+        self.text_start.append(start)
+        self.text_end.append(end)
+
+    def build(self, coords: str) -> LayoutIndex:
+        labels = sorted(self.labels, key=self.labels.get)
+        return LayoutIndex(
+            np.array(self.page_no, dtype=np.int32),
+            np.array(self.boxes, dtype=np.float32).reshape(-1, 4),
+            np.array(self.item_type, dtype=np.uint8),
+            np.array(self.text_start, dtype=np.int64),
+            np.array(self.text_end, dtype=np.int64),
+            "".join(self.parts),
+            labels,
+            coords,
+        )
+
+
+def _reading_order(doc: dict) -> Iterator[dict]:
+    """
+    Items of a DoclingDocument dict in body order, then furniture.
+    """
+    collections = {name: doc.get(name, []) for name in COLLECTIONS}
+    seen = set()
+
+    def resolve(ref: str) -> Optional[dict]:
+        _, name, index = ref.split("/")
+        items = collections.get(name)
+        return items[int(index)] if items is not None else None
+
+    def walk(node: dict):
+        for child in node.get("children", []):
+            ref = child["$ref"]
+            if ref.startswith("#/groups/"):
+                yield from walk(doc["groups"][int(ref.rsplit("/", 1)[1])])
+                continue
+            item = resolve(ref)
+            if item is None or ref in seen:
+                continue
+            seen.add(ref)
+            yield item
+            yield from walk(item)
+
+    for root in ("body", "furniture"):
+        if root in doc:
+            yield from walk(doc[root])
+
+
+def from_docling_json(json_path: Union[str, Path]) -> LayoutIndex:
+    """
+    Build the index from a `.json` export. Boxes are converted to a top-left
+    origin in PDF points.
+    """
+    doc = json.loads(Path(json_path).read_text(encoding="utf-8"))
+    heights = {int(k): v["size"]["height"] for k, v in doc.get("pages", {}).items()}
+    builder = _Builder()
+
+    for item in _reading_order(doc):
+        text = item.get("text") or ""
+        start = builder.add_text(text)
+        for prov in item.get("prov", []):
+            bbox = prov["bbox"]
+            top, bottom = bbox["t"], bbox["b"]
+            if bbox.get("coord_origin") == "BOTTOMLEFT":
+                height = heights.get(prov["page_no"], 0.0)
+                top, bottom = height - top, height - bottom
+            span_start, span_end = prov.get("charspan") or (0, len(text))
+            builder.add_box(prov["page_no"], (bbox["l"], top, bbox["r"], bottom), item.get("label", ""),
+                            start + min(span_start, len(text)), start + min(span_end, len(text)))
+    return builder.build("page")
+
+
+def from_doctags(doctags_path: Union[str, Path]) -> LayoutIndex:
+    """
+    Build the index from a `.doctags` export. Coordinates stay on the 0-500
+    `<loc_*>` grid; pages are counted from `<page_break>` tags.
+    """
+    builder = _Builder()
+    page_no = 1
+    element = None  # [tag, loc values, text parts]
+    depth = 0
+
+    with open(doctags_path, "r", encoding="utf-8") as fp:
+        for kind, value in tokenize_doctags(fp):
+            if kind == "text":
+                if element is not None:
+                    element[2].append(value)
+            elif kind == "open":
+                loc = LOC_PATTERN.fullmatch(value)
+                if loc:
+                    if element is not None:
+                        element[1].append(int(loc.group(1)))
+                elif value == "page_break":
+                    page_no += 1
+                elif value not in CONTAINER_TAGS:
+                    if element is None:
+                        element = [value, [], []]
+                        depth = 0
+                    elif value == element[0]:
+                        depth += 1
+            elif element is not None and value == element[0]:
+                if depth:
+                    depth -= 1
+                    continue
+                tag, locs, parts = element
+                text = "".join(parts).strip()
+                start = builder.add_text(text)
+                # The first four locs are the element's own box; later ones
+                # belong to nested elements such as captions.
+                if len(locs) >= 4:
+                    builder.add_box(page_no, tuple(locs[:4]), tag, start, start + len(text))
+                element = None
+    return builder.build("loc")
+
+
+def load_layout(path: Union[str, Path]) -> LayoutIndex:
+    path = Path(path)
+    if path.suffix == ".npz":
+        return LayoutIndex.load(path)
+    if path.suffix == ".doctags":
+        return from_doctags(path)
+    return from_docling_json(path)
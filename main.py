@@ -1,80 +1,60 @@
 import os
-import json
 import logging
 import time
 from pathlib import Path
-from typing import List
-
-from docling.backend.pypdfium2_backend import PyPdfiumDocumentBackend
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PdfPipelineOptions
-from docling.document_converter import DocumentConverter, PdfFormatOption
+from typing import List, Optional
 
 from langchain_ollama.llms import OllamaLLM
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 
+from provenance_chunks import chunk_with_provenance, format_citation
+from stream_export import export_document
+from tracing import span
+from vector_index import DEFAULT_INDEX_DIR, PersistentIndex, default_embeddings, make_retriever
 
-def extract_structured_pdf(file_path: str):
-    pipeline_options = PdfPipelineOptions()
-    pipeline_options.do_ocr = True
-    pipeline_options.do_table_structure = True
-    pipeline_options.table_structure_options.do_cell_matching = True
 
-    doc_converter = DocumentConverter(
-        format_options={
-            InputFormat.PDF: PdfFormatOption(
-                pipeline_options=pipeline_options,
-                backend=PyPdfiumDocumentBackend,
-            )
-        }
-    )
+def extract_structured_pdf(file_path: str, profile: Optional[str] = None):
+    # Imported here so query-only callers (cli.py query) do not load docling.
+    from pipeline_profiles import DEFAULT_PROFILE, ProfileConverter
 
-    result = doc_converter.convert(file_path)
+    profile = profile or DEFAULT_PROFILE
+    with span("extract_structured_pdf", profile=profile) as s:
+        result = ProfileConverter(profile).convert(file_path)
+        s.set(pages=result.document.num_pages())
     return result
 
 
 def save_exports(result, output_dir: Path):
-    output_dir.mkdir(parents=True, exist_ok=True)
     filename = result.input.file.stem
-
-    (output_dir / f"{filename}.json").write_text(
-        json.dumps(result.document.export_to_dict(), indent=2),
-        encoding="utf-8"
-    )
-
-    (output_dir / f"{filename}.txt").write_text(
-        result.document.export_to_text(),
-        encoding="utf-8"
-    )
-
-    (output_dir / f"{filename}.md").write_text(
-        result.document.export_to_markdown(),
-        encoding="utf-8"
-    )
-
-    (output_dir / f"{filename}.doctags").write_text(
-        result.document.export_to_document_tokens(),
-        encoding="utf-8"
-    )
+    with span("save_exports") as s:
+        stats = export_document(result.document, output_dir, filename)
+        s.set(files=len(stats), bytes=sum(st.bytes for st in stats))
 
     print(f"✅ Extracted data saved to {output_dir}")
 
 
-def create_vector_store(texts: List[str]) -> FAISS:
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L12-v2"
-    )
-    return FAISS.from_texts(texts, embeddings)
+def create_vector_store(texts: List[str], doc_id: Optional[str] = None,
+                        index_dir: Optional[Path] = DEFAULT_INDEX_DIR,
+                        metadatas: Optional[List[dict]] = None) -> FAISS:
+    """
+    Add `texts` (and their per-chunk `metadatas`) to the persisted index in
+    `index_dir` under `doc_id` and return the vector store. With
+    `index_dir=None` an in-memory store is built from scratch as before.
+    """
+    with span("create_vector_store", chunks=len(texts)):
+        if index_dir is None:
+            return FAISS.from_texts(texts, default_embeddings(), metadatas=metadatas)
 
+        index = PersistentIndex.load_or_create(index_dir)
+        index.add_document(doc_id or "default", texts, metadatas)
+        index.save()
+        return index.vector_store
 
-def get_qa_chain(vector_store):
-    llm = OllamaLLM(model="gemma:2b")
 
-    prompt_template = """
+QA_MODEL = "gemma:2b"
+QA_PROMPT_TEMPLATE = """
 Use the following context to answer the question.
 
 Context: {context}
@@ -83,14 +63,29 @@ Question: {question}
 
 Answer:"""
 
+
+def get_qa_chain(vector_store, token_budget: Optional[int] = None, k: int = 3, doc_id: Optional[str] = None):
+    """
+    With `token_budget`, the retrieved chunks are de-duplicated and trimmed
+    to their most relevant sentences before they are stuffed into the prompt.
+    With `doc_id`, only that document's chunks are retrieved from the
+    shared index.
+    """
+    llm = OllamaLLM(model=QA_MODEL)
+
     prompt = PromptTemplate(
-        template=prompt_template, input_variables=["context", "question"]
+        template=QA_PROMPT_TEMPLATE, input_variables=["context", "question"]
     )
 
+    retriever = make_retriever(vector_store, k, doc_id)
+    if token_budget:
+        from context_packing import ContextPacker, PackedRetriever
+        retriever = PackedRetriever(base_retriever=retriever, packer=ContextPacker(token_budget=token_budget))
+
     return RetrievalQA.from_chain_type(
         llm=llm,
         chain_type="stuff",
-        retriever=vector_store.as_retriever(search_kwargs={"k": 3}),
+        retriever=retriever,
         chain_type_kwargs={"prompt": prompt},
         return_source_documents=True,
     )
@@ -105,20 +100,28 @@ def main():
 
     save_exports(result, output_dir)
 
-    # Vector store from Markdown
-    md_path = output_dir / f"{result.input.file.stem}.md"
-    markdown_text = md_path.read_text(encoding="utf-8")
-
-    splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=100)
-    chunks = splitter.split_text(markdown_text)
+    # Chunk the converted document directly so every chunk keeps its pages,
+    # boxes and headings as metadata.
+    with span("chunk") as s:
+        chunks, metadatas = chunk_with_provenance(result.document)
+        # Whitespace tokens; cheap and close enough for tracking trends.
+        s.set(chunks=len(chunks), tokens=sum(len(c.split()) for c in chunks))
 
-    vector_store = create_vector_store(chunks)
-    qa_chain = get_qa_chain(vector_store)
+    doc_id = result.input.file.stem
+    vector_store = create_vector_store(chunks, doc_id=doc_id, metadatas=metadatas)
+    # The index is shared by every document; answer from this one only.
+    qa_chain = get_qa_chain(vector_store, doc_id=doc_id)
 
     question = "Hey Give me the summary of this pdf document."
     print(f"\n📌 Question: {question}")
-    response = qa_chain.invoke({"query": question})
+    with span("qa") as s:
+        response = qa_chain.invoke({"query": question})
+        s.set(documents=len(response["source_documents"]),
+              context_tokens=sum(len(d.page_content.split()) for d in response["source_documents"]),
+              answer_tokens=len(response["result"].split()))
     print(f"\n🧠 Answer: {response['result']}")
+    for doc in response["source_documents"]:
+        print(f"   📄 {format_citation(doc.metadata)}")
 
 
 if __name__ == "__main__":
@@ -1,11 +1,9 @@
 import logging
 from pathlib import Path
-from docling.backend.pypdfium2_backend import PyPdfiumDocumentBackend
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PdfPipelineOptions
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling.chunking import HybridChunker
-import re
+
+from chunk_to_location import build_text_index, locate_chunks
+from conversion_cache import cached_convert
+from pipeline_profiles import DEFAULT_PROFILE, make_converter
 
 def configure_logging():
     logging.basicConfig(
@@ -14,21 +12,11 @@ def configure_logging():
         handlers=[logging.StreamHandler()]
     )
 
-def prepare_pipeline_options() -> PdfPipelineOptions:
-    options = PdfPipelineOptions()
-    options.do_ocr = True
-    options.do_table_structure = True
-    options.table_structure_options.do_cell_matching = True
-    return options
-
-def normalize_text(text):
-    # Lowercase, remove excessive whitespace, normalize line breaks
-    return re.sub(r'\s+', ' ', text).strip().lower()
-
-def match_chunks_to_pdf(input_chunks, pdf_file_path):
+def match_chunks_to_pdf(input_chunks, pdf_file_path, profile=DEFAULT_PROFILE):
     """
     Matches the provided chunks to the PDF content and extracts metadata.
-    Handles multi-page, multi-section, and multi-bbox chunks.
+    Handles multi-page, multi-section, and multi-bbox chunks, including
+    chunks that span several document items.
     """
     pdf_path = Path(pdf_file_path)
     if not pdf_path.exists():
@@ -37,82 +25,20 @@ def match_chunks_to_pdf(input_chunks, pdf_file_path):
     configure_logging()
     logging.info("Starting PDF processing...")
 
-    pipeline_options = prepare_pipeline_options()
-
-    doc_converter = DocumentConverter(
-        format_options={
-            InputFormat.PDF: PdfFormatOption(
-                pipeline_options=pipeline_options,
-                backend=PyPdfiumDocumentBackend
-            )
-        }
-    )
+    doc_converter = make_converter(profile)
     print("Start-------------------------")
     print(doc_converter)
     print("End-------------------------")
     try:
-        conv_result = doc_converter.convert(pdf_path)
+        conv_result = cached_convert(doc_converter, pdf_path)
         document = conv_result.document
-        # Use HybridChunker to chunk the document
-        chunker = HybridChunker()
-        docling_chunks = chunker.chunk(document)
-        print("\n--- HybridChunker Chunks ---\n")
-        for i, c in enumerate(docling_chunks):
-            print(f"Chunk {i}: {c.text[:200]}{'...' if len(c.text) > 200 else ''}")
-        print("\n--- End of HybridChunker Chunks ---\n")
     except Exception as e:
         logging.exception(f"Error during document conversion: {e}")
         return []
 
-    # Now match user chunks to the HybridChunker chunks for optimal matching
-    results = []
-    for chunk in input_chunks:
-        norm_chunk = normalize_text(chunk)
-        best_match = None
-        best_score = 0
-        for doc_chunk in docling_chunks:
-            norm_doc_chunk = normalize_text(doc_chunk.text)
-            # Try both containment and overlap for better matching
-            if norm_chunk in norm_doc_chunk or norm_doc_chunk in norm_chunk:
-                # Score: proportion of overlap
-                overlap = min(len(norm_chunk), len(norm_doc_chunk))
-                score = overlap / max(len(norm_chunk), len(norm_doc_chunk))
-                if score > best_score:
-                    best_score = score
-                    best_match = doc_chunk
-        if best_match:
-            # Extract metadata from the best matching docling chunk
-            pages = set()
-            bboxes = []
-            sections = set()
-            for prov in getattr(best_match, 'prov', []):
-                pages.add(prov.page_no)
-                bboxes.append({
-                    "page_no": prov.page_no,
-                    "bbox": {
-                        "l": prov.bbox.l,
-                        "t": prov.bbox.t,
-                        "r": prov.bbox.r,
-                        "b": prov.bbox.b
-                    }
-                })
-            if hasattr(best_match, 'section_header') and best_match.section_header:
-                sections.add(best_match.section_header)
-            results.append({
-                "matched_text": best_match.text.strip(),
-                "pages": sorted(list(pages)),
-                "bounding_boxes": bboxes,
-                "section_headers": list(sections)
-            })
-        else:
-            # If no match, add a result with empty fields for visibility
-            results.append({
-                "matched_text": "",
-                "pages": [],
-                "bounding_boxes": [],
-                "section_headers": []
-            })
-    return results
+    # Locate all user chunks in one pass over the normalized document text
+    text_index = build_text_index(document)
+    return locate_chunks(input_chunks, text_index)
 
 if __name__ == "__main__":
     # Example usage
@@ -1,12 +1,13 @@
-import json
 import logging
 import time
 from pathlib import Path
+from typing import Optional
 
-from docling.backend.pypdfium2_backend import PyPdfiumDocumentBackend
-from docling.datamodel.base_models import InputFormat
 from docling.datamodel.pipeline_options import PdfPipelineOptions
-from docling.document_converter import DocumentConverter, PdfFormatOption
+
+from conversion_cache import cached_convert
+from pipeline_profiles import DEFAULT_PROFILE, build_converter, make_pipeline_options
+from stream_export import DEFAULT_FORMATS, export_document
 
 _log = logging.getLogger(__name__)
 
@@ -17,26 +18,14 @@ def configure_logging():
         handlers=[logging.StreamHandler()]
     )
 
-def prepare_pipeline_options() -> PdfPipelineOptions:
-    options = PdfPipelineOptions()
-    options.do_ocr = True
-    options.do_table_structure = True
-    options.table_structure_options.do_cell_matching = True
-    return options
-
-def export_outputs(output_dir: Path, doc_filename: str, document):
-    outputs = {
-        ".json": json.dumps(document.export_to_dict(), indent=2),
-        ".txt": document.export_to_text(),
-        ".md": document.export_to_markdown(),
-        ".doctags": document.export_to_document_tokens(),
-    }
-
-    for ext, content in outputs.items():
-        out_path = output_dir / f"{doc_filename}{ext}"
-        with out_path.open("w", encoding="utf-8") as fp:
-            fp.write(content)
-        _log.info(f"Exported {ext} to {out_path}")
+def prepare_pipeline_options(do_ocr: Optional[bool] = None, profile: str = DEFAULT_PROFILE) -> PdfPipelineOptions:
+    return make_pipeline_options(profile, do_ocr=do_ocr)
+
+def export_outputs(output_dir: Path, doc_filename: str, document, formats=DEFAULT_FORMATS):
+    stats = export_document(document, output_dir, doc_filename, formats)
+    for s in stats:
+        _log.info(f"Exported {s.format} to {s.path} ({s.bytes} bytes, {s.seconds:.2f}s)")
+    return stats
 
 def main():
     configure_logging()
@@ -50,18 +39,11 @@ def main():
 
     pipeline_options = prepare_pipeline_options()
 
-    doc_converter = DocumentConverter(
-        format_options={
-            InputFormat.PDF: PdfFormatOption(
-                pipeline_options=pipeline_options,
-                backend=PyPdfiumDocumentBackend
-            )
-        }
-    )
+    doc_converter = build_converter(pipeline_options)
 
     start_time = time.time()
     try:
-        conv_result = doc_converter.convert(input_doc_path)
+        conv_result = cached_convert(doc_converter, input_doc_path)
     except Exception as e:
         _log.exception(f"Error during document conversion: {e}")
         return
@@ -0,0 +1,148 @@
+import argparse
+import logging
+import math
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import pypdfium2 as pdfium
+from docling_core.types.doc import DoclingDocument
+
+from batch_convert import get_worker_converter, init_worker
+from only_docling import configure_logging, export_outputs
+
+_log = logging.getLogger(__name__)
+
+PageRange = Tuple[int, int]
+
+
+def page_count(pdf_path: Path) -> int:
+    pdf = pdfium.PdfDocument(str(pdf_path))
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def split_page_ranges(num_pages: int, pages_per_range: int) -> List[PageRange]:
+    """
+    Inclusive, 1-based page ranges covering the whole document.
+    """
+    return [(start, min(start + pages_per_range - 1, num_pages))
+            for start in range(1, num_pages + 1, pages_per_range)]
+
+
+def _convert_range(pdf_path: str, page_range: PageRange) -> dict:
+    conv_result = get_worker_converter().convert(Path(pdf_path), page_range=page_range)
+    # A plain dict pickles much faster than the pydantic model tree.
+    return conv_result.document.export_to_dict()
+
+
+def _default_range_size(num_pages: int, workers: int) -> int:
+    # Several ranges per worker so a slow (e.g. scanned) range does not leave
+    # the other workers idle at the end.
+    return max(1, math.ceil(num_pages / (workers * 4)))
+
+
+def _submit_ranges(pool: Executor, pdf_path: Path, ranges: List[PageRange]):
+    return {pool.submit(_convert_range, str(pdf_path), page_range): page_range for page_range in ranges}
+
+
+def iter_converted_ranges(pdf_path: Path, workers: Optional[int] = None, pages_per_range: Optional[int] = None,
+                          pool: Optional[Executor] = None, ordered: bool = True
+                          ) -> Iterator[Tuple[PageRange, DoclingDocument]]:
+    """
+    Convert `pdf_path` range by range on a process pool and yield each
+    (page_range, document) as soon as it is ready. With `ordered=True`
+    ranges are yielded in page order, holding back any that finish early.
+    """
+    pdf_path = Path(pdf_path)
+    workers = workers or os.cpu_count() or 1
+    num_pages = page_count(pdf_path)
+    ranges = split_page_ranges(num_pages, pages_per_range or _default_range_size(num_pages, workers))
+
+    own_pool = pool is None
+    if own_pool:
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(ranges)), initializer=init_worker)
+    try:
+        futures = _submit_ranges(pool, pdf_path, ranges)
+        finished = {}
+        next_index = 0
+        for future in as_completed(futures):
+            page_range = futures[future]
+            document = DoclingDocument.model_validate(future.result())
+            if not ordered:
+                yield page_range, document
+                continue
+            finished[page_range] = document
+            while next_index < len(ranges) and ranges[next_index] in finished:
+                ready = ranges[next_index]
+                yield ready, finished.pop(ready)
+                next_index += 1
+    finally:
+        if own_pool:
+            pool.shutdown(cancel_futures=True)
+
+
+def iter_pages(pdf_path: Path, workers: Optional[int] = None, pages_per_range: int = 1,
+               pool: Optional[Executor] = None) -> Iterator[Tuple[int, DoclingDocument]]:
+    """
+    Yield (page_no, single-page document) in page order as pages finish, so
+    chunking and embedding can start before the whole PDF is converted.
+    """
+    for (start, end), document in iter_converted_ranges(pdf_path, workers, pages_per_range, pool):
+        if start == end:
+            yield start, document
+            continue
+        for page_no in sorted(document.pages):
+            yield page_no, document.filter(page_nrs={page_no})
+
+
+def convert_parallel(pdf_path: Path, workers: Optional[int] = None, pages_per_range: Optional[int] = None,
+                     pool: Optional[Executor] = None) -> DoclingDocument:
+    """
+    Convert page ranges concurrently and stitch them into one document with
+    the original page numbers and provenance.
+    """
+    documents = [document for _, document in iter_converted_ranges(pdf_path, workers, pages_per_range, pool)]
+    stitched = DoclingDocument.concatenate(documents)
+    stitched.name = Path(pdf_path).stem
+    return stitched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert one large PDF in parallel page ranges.")
+    parser.add_argument("pdf")
+    parser.add_argument("-o", "--output-dir", default="output")
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("--pages-per-range", type=int, default=None)
+    args = parser.parse_args()
+
+    configure_logging()
+    pdf_path = Path(args.pdf)
+    start_time = time.perf_counter()
+    first_page_time = None
+    documents = []
+    for page_range, document in iter_converted_ranges(pdf_path, args.workers, args.pages_per_range):
+        if first_page_time is None:
+            first_page_time = time.perf_counter() - start_time
+        _log.info(f"Pages {page_range[0]}-{page_range[1]} ready after {time.perf_counter() - start_time:.2f}s")
+        documents.append(document)
+
+    document = DoclingDocument.concatenate(documents)
+    document.name = pdf_path.stem
+    total_time = time.perf_counter() - start_time
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    export_outputs(output_dir, pdf_path.stem, document)
+
+    pages = document.num_pages()
+    print(f"\n✅ {pdf_path.name}: {pages} pages in {total_time:.2f}s ({pages / total_time:.2f} pages/sec)")
+    print(f"   first pages available after {first_page_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
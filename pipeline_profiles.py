@@ -0,0 +1,264 @@
+"""
+Named conversion profiles and the one place PdfPipelineOptions are built.
+
+    fast      no OCR, no table structure: born-digital bulk archives
+    balanced  OCR only on pages without a usable text layer, table
+              structure (fast TableFormer) only on pages where layout
+              analysis found a table: interactive uploads
+    accurate  OCR, accurate TableFormer with cell matching on every page;
+              what every script here used before profiles existed
+
+Throughput and quality per profile on the bundled input/ PDFs are produced
+by `python pipeline_profiles.py --measure`, which writes
+output/profiles_benchmark.json (pages/sec, tables found, and token F1 of
+the text export against the accurate profile).
+"""
+import argparse
+import hashlib
+import json
+import re
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from itertools import groupby
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from docling.backend.pypdfium2_backend import PyPdfiumDocumentBackend
+from docling.datamodel.base_models import InputFormat
+from docling.datamodel.pipeline_options import PdfPipelineOptions, TableFormerMode
+from docling.document_converter import DocumentConverter, PdfFormatOption
+from docling_core.types.doc import DoclingDocument
+
+from conversion_cache import CachedConversionResult, CachedInput, cached_convert, converter_fingerprint
+
+TABLES_OFF = "off"
+TABLES_ALWAYS = "always"
+TABLES_ON_DEMAND = "on_demand"
+
+
+@dataclass(frozen=True)
+class ConversionProfile:
+    name: str
+    do_ocr: bool
+    tables: str
+    table_mode: TableFormerMode = TableFormerMode.ACCURATE
+    do_cell_matching: bool = True
+    # OCR only the pages whose text layer is unusable (see selective_ocr.py).
+    selective_ocr: bool = False
+
+
+PROFILES: Dict[str, ConversionProfile] = {
+    "fast": ConversionProfile("fast", do_ocr=False, tables=TABLES_OFF),
+    "balanced": ConversionProfile("balanced", do_ocr=True, tables=TABLES_ON_DEMAND,
+                                  table_mode=TableFormerMode.FAST, selective_ocr=True),
+    "accurate": ConversionProfile("accurate", do_ocr=True, tables=TABLES_ALWAYS),
+}
+DEFAULT_PROFILE = "accurate"
+
+
+def get_profile(profile) -> ConversionProfile:
+    if isinstance(profile, ConversionProfile):
+        return profile
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"Unknown conversion profile {profile!r}; choose from {sorted(PROFILES)}") from None
+
+
+def make_pipeline_options(profile=DEFAULT_PROFILE, do_ocr: Optional[bool] = None,
+                          do_table_structure: Optional[bool] = None) -> PdfPipelineOptions:
+    """
+    PdfPipelineOptions for `profile`. `do_ocr` / `do_table_structure`
+    override the profile (the on-demand table passes use the latter).
+    """
+    profile = get_profile(profile)
+    options = PdfPipelineOptions()
+    options.do_ocr = profile.do_ocr if do_ocr is None else do_ocr
+    options.do_table_structure = profile.tables == TABLES_ALWAYS if do_table_structure is None else do_table_structure
+    options.table_structure_options.mode = profile.table_mode
+    options.table_structure_options.do_cell_matching = profile.do_cell_matching
+    return options
+
+
+def build_converter(pipeline_options: PdfPipelineOptions) -> DocumentConverter:
+    return DocumentConverter(
+        format_options={
+            InputFormat.PDF: PdfFormatOption(
+                pipeline_options=pipeline_options,
+                backend=PyPdfiumDocumentBackend
+            )
+        }
+    )
+
+
+def make_converter(profile=DEFAULT_PROFILE) -> DocumentConverter:
+    return build_converter(make_pipeline_options(profile))
+
+
+def _fingerprint(converter) -> str:
+    return converter.fingerprint if hasattr(converter, "fingerprint") else converter_fingerprint(converter)
+
+
+def table_pages(document: DoclingDocument) -> List[int]:
+    return sorted({prov.page_no for table in document.tables for prov in table.prov})
+
+
+class _OnDemandTables:
+    """
+    The two-pass conversion as a single converter, so the cache stores the
+    spliced document rather than only the table-free first pass.
+    """
+
+    def __init__(self, profile_converter: "ProfileConverter"):
+        self.profile_converter = profile_converter
+
+    @property
+    def fingerprint(self) -> str:
+        converters = (self.profile_converter.converter, self.profile_converter._get_table_converter())
+        joined = ":".join(_fingerprint(c) for c in converters)
+        return hashlib.sha256(joined.encode("utf-8")).hexdigest()[:16]
+
+    def convert(self, source: Path):
+        result = self.profile_converter.converter.convert(source)
+        document = result.document
+        with_tables = set(table_pages(document))
+        if not with_tables:
+            return result
+
+        # With selective OCR, table pages are OCRed again only if the first
+        # pass OCRed them.
+        decisions = getattr(result, "page_decisions", None)
+        ocr_pages = {d.page_no for d in decisions if d.do_ocr} if decisions else None
+        parts = []
+        for (has_table, do_ocr), run in groupby(sorted(document.pages), key=lambda p: (
+                p in with_tables, None if ocr_pages is None else p in ocr_pages)):
+            run = list(run)
+            if has_table:
+                table_converter = self.profile_converter._get_table_converter(do_ocr)
+                parts.append(table_converter.convert(source, page_range=(run[0], run[-1])).document)
+            else:
+                parts.append(document.filter(page_nrs=set(run)))
+        stitched = DoclingDocument.concatenate(parts)
+        stitched.name = document.name
+        if decisions is not None:
+            result.document = stitched
+            return result
+        return CachedConversionResult(input=CachedInput(file=source), document=stitched, from_cache=False)
+
+
+class ProfileConverter:
+    """
+    Converts with a profile, including the two-pass on-demand table mode:
+    the whole document is converted without the table model, then only the
+    pages where layout found a table are converted again with it and
+    spliced back in page order. `selective_ocr` overrides the profile's
+    setting; it has no effect on profiles without OCR.
+    """
+
+    def __init__(self, profile=DEFAULT_PROFILE, use_cache: bool = True, selective_ocr: Optional[bool] = None):
+        self.profile = get_profile(profile)
+        self.selective_ocr = self.profile.do_ocr and (
+            self.profile.selective_ocr if selective_ocr is None else selective_ocr)
+        if self.selective_ocr:
+            from selective_ocr import SelectiveOcrConverter
+
+            self.converter = SelectiveOcrConverter(make_converter(self.profile),
+                                                   build_converter(make_pipeline_options(self.profile, do_ocr=False)))
+        else:
+            self.converter = make_converter(self.profile)
+        self.use_cache = use_cache
+        self._table_converters: Dict[Optional[bool], DocumentConverter] = {}
+
+    def _get_table_converter(self, do_ocr: Optional[bool] = None) -> DocumentConverter:
+        if do_ocr not in self._table_converters:
+            self._table_converters[do_ocr] = build_converter(
+                make_pipeline_options(self.profile, do_ocr=do_ocr, do_table_structure=True))
+        return self._table_converters[do_ocr]
+
+    def convert(self, source):
+        """
+        Returns a conversion result (`.input.file`, `.document`, `.status`).
+        """
+        source = Path(source)
+        if self.profile.tables != TABLES_ON_DEMAND:
+            if self.use_cache:
+                return cached_convert(self.converter, source, fingerprint=_fingerprint(self.converter))
+            return self.converter.convert(source)
+        two_pass = _OnDemandTables(self)
+        if self.use_cache:
+            return cached_convert(two_pass, source, fingerprint=two_pass.fingerprint)
+        return two_pass.convert(source)
+
+
+def _tokens(text: str) -> Counter:
+    return Counter(re.findall(r"\w+", text.lower()))
+
+
+def token_f1(candidate: str, reference: str) -> float:
+    cand, ref = _tokens(candidate), _tokens(reference)
+    overlap = sum((cand & ref).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(cand.values())
+    recall = overlap / sum(ref.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def measure_profiles(pdfs: List[Path]) -> List[dict]:
+    converters = {name: ProfileConverter(name, use_cache=False) for name in PROFILES}
+    # Load every model up front so the first PDF is not charged for it.
+    for profile_converter in converters.values():
+        profile_converter.converter.initialize_pipeline(InputFormat.PDF)
+        if profile_converter.profile.tables == TABLES_ON_DEMAND:
+            for do_ocr in ((True, False) if profile_converter.selective_ocr else (None,)):
+                profile_converter._get_table_converter(do_ocr).initialize_pipeline(InputFormat.PDF)
+    results = []
+    for pdf_path in pdfs:
+        texts = {}
+        rows = []
+        for name in ("accurate", "balanced", "fast"):
+            start_time = time.perf_counter()
+            document = converters[name].convert(pdf_path).document
+            seconds = time.perf_counter() - start_time
+            texts[name] = document.export_to_text()
+            rows.append({
+                "pdf": pdf_path.name,
+                "profile": name,
+                "pages": document.num_pages(),
+                "seconds": round(seconds, 3),
+                "pages_per_sec": round(document.num_pages() / seconds, 3) if seconds else None,
+                "tables": len(document.tables),
+            })
+        for row in rows:
+            row["text_f1_vs_accurate"] = round(token_f1(texts[row["profile"]], texts["accurate"]), 4)
+        results.extend(rows)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List conversion profiles or measure them on input/.")
+    parser.add_argument("--measure", action="store_true")
+    parser.add_argument("--input-dir", default="input")
+    parser.add_argument("--output", default="output/profiles_benchmark.json")
+    args = parser.parse_args()
+
+    if not args.measure:
+        for profile in PROFILES.values():
+            print(f"{profile.name:<9} ocr={profile.do_ocr} selective_ocr={profile.selective_ocr} "
+                  f"tables={profile.tables} "
+                  f"tableformer={profile.table_mode.value} cell_matching={profile.do_cell_matching}")
+        return
+
+    pdfs = sorted(Path(args.input_dir).glob("*.pdf"))
+    results = measure_profiles(pdfs)
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.output).write_text(json.dumps({"profiles": {k: asdict(v) for k, v in PROFILES.items()},
+                                             "results": results}, indent=2, default=str), encoding="utf-8")
+    for row in results:
+        print(f"{row['pdf']:<45} {row['profile']:<9} {row['pages_per_sec']:>8} pages/s  "
+              f"{row['tables']:>3} tables  F1 {row['text_f1_vs_accurate']}")
+
+
+if __name__ == "__main__":
+    main()
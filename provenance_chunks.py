@@ -0,0 +1,92 @@
+"""
+Chunk a DoclingDocument directly and keep each chunk's provenance.
+
+HybridChunker works on the converted document, so every chunk still knows
+the items it came from. Their pages, bounding boxes and the section headings
+above them are stored as compact chunk metadata in the vector index:
+
+    {"pages": [3, 4], "boxes": [[3, l, t, r, b], ...], "headings": ["2 Method"]}
+
+Retrieved documents then carry their citation, and `location_from_metadata`
+gives the same shape `match_chunks_to_pdf` / `chunk_to_location` return
+without converting the PDF a second time.
+"""
+import logging
+from typing import List, Optional, Tuple
+
+from embedding_cache import DEFAULT_MODEL_NAME
+
+_log = logging.getLogger(__name__)
+
+BOX_DECIMALS = 1
+
+
+def make_chunker(tokenizer: str = DEFAULT_MODEL_NAME, max_tokens: Optional[int] = None):
+    """
+    HybridChunker sized for the embedding model's tokenizer, so chunks are
+    not silently truncated at embedding time.
+    """
+    from docling.chunking import HybridChunker
+
+    if max_tokens is None:
+        return HybridChunker(tokenizer=tokenizer)
+    return HybridChunker(tokenizer=tokenizer, max_tokens=max_tokens)
+
+
+def chunk_metadata(chunk) -> dict:
+    pages = set()
+    boxes = []
+    for item in chunk.meta.doc_items:
+        for prov in getattr(item, "prov", []):
+            pages.add(prov.page_no)
+            bbox = prov.bbox
+            boxes.append([prov.page_no] + [round(v, BOX_DECIMALS) for v in (bbox.l, bbox.t, bbox.r, bbox.b)])
+    return {"pages": sorted(pages), "boxes": boxes, "headings": list(chunk.meta.headings or [])}
+
+
+def chunk_with_provenance(document, chunker=None) -> Tuple[List[str], List[dict]]:
+    """
+    Texts and metadata for every chunk of `document`. The text is the
+    contextualized form (headings prepended), which is what gets embedded.
+    """
+    chunker = chunker or make_chunker()
+    texts, metadatas = [], []
+    for chunk in chunker.chunk(dl_doc=document):
+        texts.append(chunker.contextualize(chunk=chunk))
+        metadatas.append(chunk_metadata(chunk))
+    _log.info(f"Chunked {document.name} into {len(texts)} chunks with provenance")
+    return texts, metadatas
+
+
+def index_document(index, doc_id: str, document, chunker=None) -> List[str]:
+    """
+    Chunk `document` and add it to a PersistentIndex with its provenance.
+    """
+    texts, metadatas = chunk_with_provenance(document, chunker)
+    return index.add_document(doc_id, texts, metadatas)
+
+
+def location_from_metadata(metadata: dict) -> dict:
+    """
+    Stored metadata in the `pages` / `bounding_boxes` / `section_headers`
+    form used by chunk_to_location.
+    """
+    return {
+        "pages": metadata.get("pages", []),
+        "bounding_boxes": [{"page_no": page_no, "bbox": {"l": l, "t": t, "r": r, "b": b}}
+                           for page_no, l, t, r, b in metadata.get("boxes", [])],
+        "section_headers": metadata.get("headings", []),
+    }
+
+
+def format_citation(metadata: dict) -> str:
+    """
+    e.g. "sample-1, p. 3-4, 2 Method"
+    """
+    parts = [metadata.get("doc_id", "")]
+    pages = metadata.get("pages") or []
+    if pages:
+        parts.append(f"p. {pages[0]}" if len(pages) == 1 else f"p. {pages[0]}-{pages[-1]}")
+    if metadata.get("headings"):
+        parts.append(metadata["headings"][-1])
+    return ", ".join(p for p in parts if p)
@@ -0,0 +1,226 @@
+import argparse
+import hashlib
+import logging
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from itertools import groupby
+from pathlib import Path
+from typing import List, Optional
+
+import pypdfium2 as pdfium
+from docling.datamodel.base_models import ConversionStatus, InputFormat
+from docling_core.types.doc import DoclingDocument
+
+from conversion_cache import CachedInput, converter_fingerprint
+from only_docling import build_converter, configure_logging, export_outputs, prepare_pipeline_options
+
+_log = logging.getLogger(__name__)
+
+MIN_CHARS = 200
+MIN_QUALITY = 0.85
+MIN_COVERAGE = 0.05
+
+
+@dataclass
+class PageDecision:
+    page_no: int
+    chars: int
+    quality: float
+    coverage: float
+    do_ocr: bool
+    seconds: float = 0.0
+
+
+@dataclass
+class SelectiveOcrResult:
+    input: CachedInput
+    document: DoclingDocument
+    status: ConversionStatus = ConversionStatus.SUCCESS
+    page_decisions: List[PageDecision] = field(default_factory=list)
+    seconds: float = 0.0
+    # Extra seconds OCR costs per page, and that cost times the pages that
+    # skipped OCR.
+    ocr_seconds_per_page: float = 0.0
+    ocr_seconds_saved: float = 0.0
+
+    @property
+    def ocr_pages(self) -> List[int]:
+        return [d.page_no for d in self.page_decisions if d.do_ocr]
+
+
+def _text_quality(text: str) -> float:
+    """
+    Share of non-space characters that are letters, digits or ordinary
+    punctuation. Broken font encodings show up as control characters,
+    private-use glyphs or U+FFFD and drag this down.
+    """
+    chars = [c for c in text if not c.isspace()]
+    if not chars:
+        return 0.0
+    good = sum(1 for c in chars if unicodedata.category(c)[0] in "LNPS" and c != "�")
+    return good / len(chars)
+
+
+def score_text_layer(pdf_path: Path, min_chars: int = MIN_CHARS, min_quality: float = MIN_QUALITY,
+                     min_coverage: float = MIN_COVERAGE) -> List[PageDecision]:
+    """
+    Score every page's embedded text layer with pypdfium2 (the library
+    behind PyPdfiumDocumentBackend) and decide which pages need OCR.
+    """
+    decisions = []
+    pdf = pdfium.PdfDocument(str(pdf_path))
+    try:
+        for index in range(len(pdf)):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            try:
+                text = textpage.get_text_range()
+                width, height = page.get_size()
+                text_area = 0.0
+                for k in range(textpage.count_rects()):
+                    l, b, r, t = textpage.get_rect(k)
+                    text_area += max(0.0, r - l) * max(0.0, t - b)
+                coverage = min(1.0, text_area / (width * height)) if width and height else 0.0
+            finally:
+                textpage.close()
+                page.close()
+
+            chars = len(text.strip())
+            quality = _text_quality(text)
+            usable = chars >= min_chars and quality >= min_quality and coverage >= min_coverage
+            decisions.append(PageDecision(index + 1, chars, round(quality, 3), round(coverage, 3), not usable))
+    finally:
+        pdf.close()
+    return decisions
+
+
+def measure_ocr_cost(pdf_path: Path, page_no: int, ocr_converter, text_converter) -> float:
+    """
+    Extra seconds OCR adds to page `page_no`. Both pipelines are initialised
+    first so model loading is not counted.
+    """
+    seconds = []
+    for converter in (ocr_converter, text_converter):
+        converter.initialize_pipeline(InputFormat.PDF)
+        start_time = time.perf_counter()
+        converter.convert(pdf_path, page_range=(page_no, page_no))
+        seconds.append(time.perf_counter() - start_time)
+    return max(0.0, seconds[0] - seconds[1])
+
+
+def convert_selective_ocr(pdf_path: Path, decisions: Optional[List[PageDecision]] = None,
+                          ocr_converter=None, text_converter=None,
+                          ocr_seconds_per_page: Optional[float] = None) -> SelectiveOcrResult:
+    """
+    Convert `pdf_path`, running OCR only on the pages whose text layer was
+    judged unusable. Consecutive pages with the same decision are converted
+    as one page range and the ranges are stitched in page order.
+
+    The time saved is estimated from the per-page OCR cost measured on this
+    document when it has both kinds of page; otherwise from
+    `ocr_seconds_per_page`, or, when that is not given, from one text-layer
+    page converted both ways.
+    """
+    pdf_path = Path(pdf_path)
+    decisions = decisions or score_text_layer(pdf_path)
+    start_time = time.perf_counter()
+
+    documents = []
+    for do_ocr, group in groupby(decisions, key=lambda d: d.do_ocr):
+        group = list(group)
+        if do_ocr:
+            ocr_converter = ocr_converter or build_converter(prepare_pipeline_options(do_ocr=True))
+            converter = ocr_converter
+        else:
+            text_converter = text_converter or build_converter(prepare_pipeline_options(do_ocr=False))
+            converter = text_converter
+        page_range = (group[0].page_no, group[-1].page_no)
+        range_start = time.perf_counter()
+        conv_result = converter.convert(pdf_path, page_range=page_range)
+        per_page = (time.perf_counter() - range_start) / len(group)
+        for decision in group:
+            decision.seconds = per_page
+        documents.append(conv_result.document)
+        _log.info(f"Pages {page_range[0]}-{page_range[1]}: {'OCR' if do_ocr else 'text layer'}, "
+                  f"{per_page:.2f}s/page")
+
+    document = DoclingDocument.concatenate(documents) if len(documents) != 1 else documents[0]
+    document.name = pdf_path.stem
+    result = SelectiveOcrResult(
+        input=CachedInput(file=pdf_path),
+        document=document,
+        page_decisions=decisions,
+        seconds=time.perf_counter() - start_time,
+    )
+
+    ocr = [d.seconds for d in decisions if d.do_ocr]
+    plain = [d for d in decisions if not d.do_ocr]
+    if ocr and plain:
+        ocr_seconds_per_page = max(0.0, sum(ocr) / len(ocr) - sum(d.seconds for d in plain) / len(plain))
+    elif plain and ocr_seconds_per_page is None:
+        ocr_converter = ocr_converter or build_converter(prepare_pipeline_options(do_ocr=True))
+        ocr_seconds_per_page = measure_ocr_cost(pdf_path, plain[0].page_no, ocr_converter, text_converter)
+    result.ocr_seconds_per_page = ocr_seconds_per_page or 0.0
+    result.ocr_seconds_saved = result.ocr_seconds_per_page * len(plain)
+    return result
+
+
+class SelectiveOcrConverter:
+    """
+    A pair of converters, with and without OCR, used as one converter by
+    `ProfileConverter`. Unless `ocr_seconds_per_page` is given, the per-page
+    OCR cost is measured on the first document that needs it and reused.
+    """
+
+    def __init__(self, ocr_converter, text_converter, ocr_seconds_per_page: Optional[float] = None):
+        self.ocr_converter = ocr_converter
+        self.text_converter = text_converter
+        self.ocr_seconds_per_page = ocr_seconds_per_page
+
+    @property
+    def fingerprint(self) -> str:
+        converters = (self.ocr_converter, self.text_converter)
+        joined = ":".join(["selective-ocr"] + [converter_fingerprint(c) for c in converters])
+        return hashlib.sha256(joined.encode("utf-8")).hexdigest()[:16]
+
+    def initialize_pipeline(self, input_format: InputFormat):
+        self.ocr_converter.initialize_pipeline(input_format)
+        self.text_converter.initialize_pipeline(input_format)
+
+    def convert(self, source: Path) -> SelectiveOcrResult:
+        result = convert_selective_ocr(Path(source), ocr_converter=self.ocr_converter,
+                                       text_converter=self.text_converter,
+                                       ocr_seconds_per_page=self.ocr_seconds_per_page)
+        if self.ocr_seconds_per_page is None and len(result.ocr_pages) < len(result.page_decisions):
+            self.ocr_seconds_per_page = result.ocr_seconds_per_page
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a PDF, OCRing only pages without a usable text layer.")
+    parser.add_argument("pdf")
+    parser.add_argument("-o", "--output-dir", default="output")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the per-page decisions")
+    parser.add_argument("--ocr-seconds-per-page", type=float, default=None,
+                        help="Per-page OCR cost for the time-saved estimate (default: measured)")
+    args = parser.parse_args()
+
+    configure_logging()
+    pdf_path = Path(args.pdf)
+    decisions = score_text_layer(pdf_path)
+    for d in decisions:
+        print(f"  page {d.page_no:4d}: {d.chars:6d} chars, quality {d.quality:.2f}, "
+              f"coverage {d.coverage:.2f} -> {'OCR' if d.do_ocr else 'text layer'}")
+    if args.dry_run:
+        return
+
+    result = convert_selective_ocr(pdf_path, decisions, ocr_seconds_per_page=args.ocr_seconds_per_page)
+    export_outputs(Path(args.output_dir), pdf_path.stem, result.document)
+    print(f"\n✅ {pdf_path.name}: OCR on {len(result.ocr_pages)}/{len(decisions)} pages, {result.seconds:.2f}s")
+    print(f"   estimated OCR time saved: {result.ocr_seconds_saved:.2f}s "
+          f"({result.ocr_seconds_per_page:.2f}s/page)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""
+Resident conversion and query service.
+
+Keeps the docling converter (one per worker thread), the embedding model and
+the FAISS index loaded, and serves JSON over local HTTP or a Unix socket:
+
+    POST /convert   {"path": "input/sample-1.pdf", "index": true}
+                    or the PDF bytes with Content-Type: application/pdf
+    POST /query     {"question": "..."}
+    GET  /jobs/<id> job status and, once done, its result
+    GET  /health    queue depth, workers, job counts
+
+Requests are queued and handled by a fixed number of workers; the POST
+returns 202 with a job ID immediately. When the queue is full the service
+answers 429 with Retry-After instead of queueing without bound, and bodies
+over --max-upload-mb get 413.
+
+    python service.py --port 8765 --workers 2 --queue-size 16
+    python service.py --unix-socket /tmp/rag.sock
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import re
+import socketserver
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+from tracing import span
+
+_log = logging.getLogger(__name__)
+
+# Document IDs become export file names; no separators or leading dots.
+DOC_ID_PATTERN = re.compile(r"[A-Za-z0-9_][A-Za-z0-9_.-]*")
+DEFAULT_MAX_UPLOAD_BYTES = 100 * 1024 ** 2
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    payload: dict
+    status: str = QUEUED
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        data = {"id": self.id, "kind": self.kind, "status": self.status, "created": self.created,
+                "started": self.started, "finished": self.finished}
+        if self.started:
+            data["queued_seconds"] = self.started - self.created
+        if self.finished:
+            data["run_seconds"] = self.finished - self.started
+            data["result"] = self.result
+            data["error"] = self.error
+        return data
+
+
+class QueueFull(Exception):
+    pass
+
+
+class RagService:
+    """
+    Warm models plus a bounded job queue drained by `workers` threads. Each
+    worker owns its own converter, since docling converters are not shared
+    across threads here; the embedder and index are shared, with index
+    writes and reads serialized by a lock.
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 16, profile: str = "accurate",
+                 index_dir: Optional[Path] = None, output_dir: Path = Path("output"),
+                 upload_dir: Optional[Path] = None, max_finished_jobs: int = 1000,
+                 max_upload_bytes: int = DEFAULT_MAX_UPLOAD_BYTES):
+        self.workers = workers
+        self.max_upload_bytes = max_upload_bytes
+        self.profile = profile
+        self.index_dir = Path(index_dir) if index_dir else None
+        self.output_dir = Path(output_dir)
+        self.upload_dir = Path(upload_dir or tempfile.mkdtemp(prefix="rag_uploads_"))
+        self.max_finished_jobs = max_finished_jobs
+        self.queue: "queue.Queue[Optional[Job]]" = queue.Queue(maxsize=queue_size)
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._local = threading.local()
+        self._threads = []
+        self._busy = 0
+        self.index = None
+        self._qa_chain = None
+
+    def warm_up(self):
+        from vector_index import DEFAULT_INDEX_DIR, PersistentIndex
+
+        start_time = time.perf_counter()
+        self.index = PersistentIndex.load_or_create(self.index_dir or DEFAULT_INDEX_DIR)
+        _log.info(f"Embedding model and index loaded in {time.perf_counter() - start_time:.1f}s")
+
+    def _converter(self):
+        converter = getattr(self._local, "converter", None)
+        if converter is None:
+            from docling.datamodel.base_models import InputFormat
+            from pipeline_profiles import ProfileConverter
+
+            start_time = time.perf_counter()
+            converter = ProfileConverter(self.profile)
+            converter.converter.initialize_pipeline(InputFormat.PDF)
+            self._local.converter = converter
+            _log.info(f"{threading.current_thread().name}: converter ready in "
+                      f"{time.perf_counter() - start_time:.1f}s")
+        return converter
+
+    def start(self):
+        self.warm_up()
+        ready = threading.Barrier(self.workers + 1)
+        errors = []
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._worker, args=(ready, errors), name=f"rag-worker-{n}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        try:
+            ready.wait()
+        except threading.BrokenBarrierError:
+            # A worker could not load its converter and broke the barrier;
+            # the others return as soon as they see that.
+            for thread in self._threads:
+                thread.join()
+            self._threads.clear()
+            raise RuntimeError(f"Worker failed to start: {errors[0]}") from errors[0]
+
+    def stop(self):
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def submit(self, kind: str, payload: dict) -> Job:
+        job = Job(uuid.uuid4().hex, kind, payload)
+        with self._jobs_lock:
+            self.jobs[job.id] = job
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            with self._jobs_lock:
+                del self.jobs[job.id]
+            raise QueueFull(f"{self.queue.maxsize} jobs already queued") from None
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        with self._jobs_lock:
+            return self.jobs.get(job_id)
+
+    def _forget_old_jobs(self):
+        with self._jobs_lock:
+            finished = [j.id for j in self.jobs.values() if j.status in (DONE, FAILED)]
+            for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+                del self.jobs[job_id]
+
+    def _worker(self, ready: threading.Barrier, errors: list):
+        try:
+            self._converter()
+        except Exception as e:
+            _log.exception(f"{threading.current_thread().name}: converter failed to load")
+            errors.append(e)
+            ready.abort()
+            return
+        try:
+            ready.wait()
+        except threading.BrokenBarrierError:
+            return
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            with self._jobs_lock:
+                job.status = RUNNING
+                job.started = time.time()
+                self._busy += 1
+            result = error = None
+            try:
+                handler = self._convert if job.kind == "convert" else self._query
+                with span(f"service.{job.kind}"):
+                    result = handler(job.payload)
+            except Exception as e:
+                _log.exception(f"Job {job.id} failed")
+                error = f"{type(e).__name__}: {e}"
+            finally:
+                if job.payload.get("upload"):
+                    Path(job.payload["path"]).unlink(missing_ok=True)
+                # Status last, so a poller never sees "done" without the result.
+                with self._jobs_lock:
+                    self._busy -= 1
+                    job.result = result
+                    job.error = error
+                    job.finished = time.time()
+                    job.status = FAILED if error else DONE
+                self.queue.task_done()
+                self._forget_old_jobs()
+
+    def _convert(self, payload: dict) -> dict:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+        from stream_export import export_document
+
+        pdf_path = Path(payload["path"])
+        result = self._converter().convert(pdf_path)
+        document = result.document
+        doc_id = payload.get("doc_id") or pdf_path.stem
+        response = {"doc_id": doc_id, "pages": document.num_pages(), "status": str(result.status)}
+
+        if payload.get("export", True):
+            stats = export_document(document, self.output_dir, doc_id)
+            response["exports"] = [str(s.path) for s in stats]
+        if payload.get("index", True):
+            splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=100)
+            chunks = splitter.split_text(document.export_to_markdown())
+            with self._index_lock:
+                self.index.add_document(doc_id, chunks)
+                self.index.save()
+            response["chunks"] = len(chunks)
+        return response
+
+    def _query(self, payload: dict) -> dict:
+        from main import get_qa_chain
+
+        question = payload["question"]
+        # Only retrieval needs the index lock; the LLM call runs unlocked so
+        # queries do not queue behind each other's generation.
+        with self._index_lock:
+            if self._qa_chain is None:
+                self._qa_chain = get_qa_chain(self.index.vector_store)
+            documents = self._qa_chain.retriever.invoke(question)
+        answer = self._qa_chain.combine_documents_chain.invoke(
+            {"input_documents": documents, "question": question})["output_text"]
+        return {
+            "answer": answer,
+            "sources": [{"doc_id": d.metadata.get("doc_id"), "text": d.page_content} for d in documents],
+        }
+
+    def health(self) -> dict:
+        with self._jobs_lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "workers": self.workers,
+            "busy_workers": self._busy,
+            "jobs": counts,
+            "indexed_documents": len(self.index.documents) if self.index else 0,
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "ServiceHTTPServer"
+
+    def log_message(self, format, *args):
+        _log.debug(format % args)
+
+    def address_string(self):
+        # Unix-socket clients have no (host, port) address.
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def _send_json(self, payload: dict, status: int = 200, headers: Optional[dict] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/health":
+            self._send_json(service.health())
+        elif self.path.startswith("/jobs/"):
+            job = service.get_job(self.path[len("/jobs/"):])
+            if job is None:
+                self._send_json({"error": "unknown job"}, 404)
+            else:
+                self._send_json(job.to_dict())
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        service = self.server.service
+        if self.path not in ("/convert", "/query"):
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            self._send_json({"error": "invalid Content-Length"}, 400)
+            return
+        if length > service.max_upload_bytes:
+            # The body is left unread, so the connection cannot be reused.
+            self.close_connection = True
+            self._send_json({"error": f"request body of {length} bytes exceeds the "
+                                      f"{service.max_upload_bytes} byte limit"}, 413)
+            return
+        body = self.rfile.read(length)
+        is_upload = self.headers.get("Content-Type", "").startswith("application/pdf")
+        if is_upload:
+            payload = {"path": "upload", "doc_id": self.headers.get("X-Doc-Id")}
+        else:
+            try:
+                payload = json.loads(body or b"{}")
+            except json.JSONDecodeError as e:
+                self._send_json({"error": f"invalid JSON: {e}"}, 400)
+                return
+
+        kind = self.path.lstrip("/")
+        required = "path" if kind == "convert" else "question"
+        if not payload.get(required):
+            self._send_json({"error": f"missing {required!r}"}, 400)
+            return
+        doc_id = payload.get("doc_id")
+        if doc_id is not None and not DOC_ID_PATTERN.fullmatch(str(doc_id)):
+            self._send_json({"error": f"invalid doc_id {doc_id!r}; use letters, digits, '_', '.' and '-'"}, 400)
+            return
+
+        if is_upload:
+            upload = service.upload_dir / f"{uuid.uuid4().hex}.pdf"
+            upload.write_bytes(body)
+            payload.update(path=str(upload), upload=True)
+        try:
+            job = service.submit(kind, payload)
+        except QueueFull as e:
+            if is_upload:
+                upload.unlink(missing_ok=True)
+            self._send_json({"error": str(e)}, 429, {"Retry-After": "1"})
+            return
+        self._send_json({"id": job.id, "status": job.status}, 202, {"Location": f"/jobs/{job.id}"})
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service: RagService):
+        super().__init__(address, _Handler)
+        self.service = service
+
+
+class UnixServiceHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, service: RagService):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _Handler)
+        self.service = service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the conversion and query service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--profile", default="accurate")
+    parser.add_argument("--index-dir")
+    parser.add_argument("--output-dir", default="output")
+    parser.add_argument("--max-upload-mb", type=float, default=DEFAULT_MAX_UPLOAD_BYTES / 1024 ** 2)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    service = RagService(workers=args.workers, queue_size=args.queue_size, profile=args.profile,
+                         index_dir=args.index_dir, output_dir=Path(args.output_dir),
+                         max_upload_bytes=int(args.max_upload_mb * 1024 ** 2))
+    service.start()
+    if args.unix_socket:
+        server = UnixServiceHTTPServer(args.unix_socket, service)
+        where = args.unix_socket
+    else:
+        server = ServiceHTTPServer((args.host, args.port), service)
+        where = f"http://{args.host}:{args.port}"
+    print(f"✅ Service ready on {where} ({args.workers} workers, queue of {args.queue_size})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
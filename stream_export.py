@@ -0,0 +1,178 @@
+import argparse
+import json
+import logging
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple, Union
+
+import msgpack
+from docling_core.types.doc import DoclingDocument
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_FORMATS = (".json", ".txt", ".md", ".doctags")
+BINARY_SUFFIX = ".dlb"
+BINARY_MAGIC = b"DLB1"
+ITEM_COLLECTIONS = ("texts", "tables", "pictures", "key_value_items", "form_items", "groups")
+WRITE_BUFFER = 1 << 20
+_LENGTH = struct.Struct(">I")
+
+
+@dataclass
+class ExportStats:
+    format: str
+    path: Path
+    bytes: int
+    seconds: float
+
+
+def _write_json(document: DoclingDocument, fp):
+    # Same bytes as json.dumps(..., indent=2), written piece by piece.
+    for piece in json.JSONEncoder(indent=2).iterencode(document.export_to_dict()):
+        fp.write(piece)
+
+
+def _write_text(document: DoclingDocument, fp):
+    fp.write(document.export_to_text())
+
+
+def _write_markdown(document: DoclingDocument, fp):
+    fp.write(document.export_to_markdown())
+
+
+def _write_doctags(document: DoclingDocument, fp):
+    fp.write(document.export_to_document_tokens())
+
+
+TEXT_WRITERS = {
+    ".json": _write_json,
+    ".txt": _write_text,
+    ".md": _write_markdown,
+    ".doctags": _write_doctags,
+}
+
+
+def _page_of(item: dict) -> int:
+    prov = item.get("prov") or []
+    return prov[0]["page_no"] if prov else 0
+
+
+def _write_record(fp, payload) -> None:
+    data = msgpack.packb(payload, use_bin_type=True)
+    fp.write(_LENGTH.pack(len(data)))
+    fp.write(data)
+
+
+def write_binary(document: DoclingDocument, fp):
+    """
+    Compact binary form: a magic tag, then length-prefixed msgpack records.
+    The first record is the document without its item lists; each following
+    record holds the items whose first provenance is on one page (page 0 for
+    items without provenance, such as groups).
+    """
+    doc = document.export_to_dict()
+    by_page: Dict[int, List[Tuple[str, int, dict]]] = {}
+    counts = {}
+    for collection in ITEM_COLLECTIONS:
+        items = doc.pop(collection, [])
+        counts[collection] = len(items)
+        for index, item in enumerate(items):
+            by_page.setdefault(_page_of(item), []).append((collection, index, item))
+
+    fp.write(BINARY_MAGIC)
+    _write_record(fp, {"kind": "header", "version": 1, "counts": counts, "doc": doc})
+    for page_no in sorted(by_page):
+        _write_record(fp, {"kind": "page", "page_no": page_no, "items": by_page[page_no]})
+
+
+def _iter_records(path: Union[str, Path]) -> Iterator[dict]:
+    with open(path, "rb") as fp:
+        if fp.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"{path} is not a {BINARY_SUFFIX} file")
+        while True:
+            header = fp.read(_LENGTH.size)
+            if not header:
+                return
+            (length,) = _LENGTH.unpack(header)
+            yield msgpack.unpackb(fp.read(length), raw=False, strict_map_key=False)
+
+
+def iter_binary_pages(path: Union[str, Path]) -> Iterator[Tuple[int, List[Tuple[str, int, dict]]]]:
+    """
+    Yield (page_no, [(collection, index, item), ...]) without loading the
+    whole document.
+    """
+    for record in _iter_records(path):
+        if record["kind"] == "page":
+            yield record["page_no"], [tuple(item) for item in record["items"]]
+
+
+def load_binary(path: Union[str, Path]) -> DoclingDocument:
+    records = _iter_records(path)
+    header = next(records)
+    doc = header["doc"]
+    for collection, count in header["counts"].items():
+        doc[collection] = [None] * count
+    for record in records:
+        for collection, index, item in record["items"]:
+            doc[collection][index] = item
+    return DoclingDocument.model_validate(doc)
+
+
+def _export_one(document: DoclingDocument, out_path: Path, suffix: str) -> ExportStats:
+    start_time = time.perf_counter()
+    if suffix == BINARY_SUFFIX:
+        with out_path.open("wb", buffering=WRITE_BUFFER) as fp:
+            write_binary(document, fp)
+    else:
+        with out_path.open("w", encoding="utf-8", buffering=WRITE_BUFFER) as fp:
+            TEXT_WRITERS[suffix](document, fp)
+    return ExportStats(suffix, out_path, out_path.stat().st_size, time.perf_counter() - start_time)
+
+
+def export_document(document: DoclingDocument, output_dir: Path, doc_filename: str,
+                    formats: Sequence[str] = DEFAULT_FORMATS, max_workers: int = 4) -> List[ExportStats]:
+    """
+    Write every requested format of `document` concurrently, each streamed
+    to its own file, and return bytes written and time per format.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    unknown = [f for f in formats if f != BINARY_SUFFIX and f not in TEXT_WRITERS]
+    if unknown:
+        raise ValueError(f"Unknown export formats: {unknown}")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(formats)))) as pool:
+        futures = [pool.submit(_export_one, document, output_dir / f"{doc_filename}{suffix}", suffix)
+                   for suffix in formats]
+        return [future.result() for future in futures]
+
+
+def print_stats(stats: List[ExportStats]):
+    for s in stats:
+        print(f"  {s.format:<9} {s.bytes / 1024:10.1f} KiB  {s.seconds * 1000:8.1f} ms  {s.path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-export a converted document and time each format.")
+    parser.add_argument("source", help=f"A docling .json export or a {BINARY_SUFFIX} file")
+    parser.add_argument("-o", "--output-dir", default="output")
+    parser.add_argument("--formats", nargs="+", default=list(DEFAULT_FORMATS) + [BINARY_SUFFIX])
+    args = parser.parse_args()
+
+    source = Path(args.source)
+    start_time = time.perf_counter()
+    if source.suffix == BINARY_SUFFIX:
+        document = load_binary(source)
+    else:
+        document = DoclingDocument.load_from_json(source)
+    print(f"Loaded {source} in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+
+    formats = [f if f.startswith(".") else f".{f}" for f in args.formats]
+    print_stats(export_document(document, Path(args.output_dir), source.stem, formats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Minimal Ollama-compatible HTTP server for running the QA steps offline.
+
+It answers /api/generate and /api/chat (streaming or not) with a canned
+reply after an optional delay, and /api/tags with the stub model, which is
+enough for `OllamaLLM(model=..., base_url=stub.url)`.
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+DEFAULT_ANSWER = "This is a stub answer."
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: "StubLLMServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": self.server.model, "model": self.server.model}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        prompt = request.get("prompt") or " ".join(m.get("content", "") for m in request.get("messages", []))
+        self.server.record(prompt)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        answer = self.server.answer
+        base = {
+            "model": request.get("model", self.server.model),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        final = dict(base, done=True, done_reason="stop", prompt_eval_count=len(prompt.split()),
+                     eval_count=len(answer.split()), total_duration=int(self.server.latency * 1e9))
+        chat = self.path == "/api/chat"
+
+        def piece(text: str) -> dict:
+            if chat:
+                return {"message": {"role": "assistant", "content": text}}
+            return {"response": text}
+
+        if not request.get("stream", True):
+            self._send_json(dict(final, **piece(answer)))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for word in answer.split(" "):
+            self.wfile.write((json.dumps(dict(base, done=False, **piece(word + " "))) + "\n").encode("utf-8"))
+        self.wfile.write((json.dumps(dict(final, **piece(""))) + "\n").encode("utf-8"))
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, answer: str = DEFAULT_ANSWER,
+                 latency: float = 0.0, model: str = "stub"):
+        super().__init__((host, port), _StubHandler)
+        self.answer = answer
+        self.latency = latency
+        self.model = model
+        self.prompts = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, prompt: str):
+        with self._lock:
+            self.prompts.append(prompt)
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "StubLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub Ollama server.")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument("--answer", default=DEFAULT_ANSWER)
+    args = parser.parse_args()
+
+    server = StubLLMServer(port=args.port, answer=args.answer, latency=args.latency)
+    print(f"Stub LLM listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
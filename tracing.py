@@ -0,0 +1,275 @@
+"""
+Lightweight spans and metrics for the pipeline stages.
+
+    from tracing import span
+
+    with span("convert", pdf=str(path)) as s:
+        result = converter.convert(path)
+        s.set(pages=result.document.num_pages())
+
+Finished spans go to the configured sinks: `LogSink` (one structured log
+line per span), `PrometheusSink` (text exposition file, rewritten after
+each top-level span) or `CollectorSink` (kept in memory, for tests). With
+no sinks configured tracing is disabled and `span()` returns a shared
+no-op object, so the calls can stay in place in production.
+
+Sinks can also be picked with the RAG_TRACE environment variable, e.g.
+RAG_TRACE=log or RAG_TRACE=log,prom:metrics/rag.prom
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+_log = logging.getLogger(__name__)
+
+Number = Union[int, float]
+DEFAULT_EVENT_KEYS = ("conversion_cache", "index", "profile")
+
+
+class Span:
+    __slots__ = ("name", "attrs", "parent", "start", "duration", "error", "_token")
+
+    def __init__(self, name: str, attrs: dict, parent: Optional["Span"]):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.start = 0.0
+        self.duration = 0.0
+        self.error: Optional[str] = None
+        self._token = None
+
+    @property
+    def path(self) -> str:
+        """
+        Dotted name including the enclosing spans, e.g. "qa.retrieve".
+        """
+        return f"{self.parent.path}.{self.name}" if self.parent else self.name
+
+    def set(self, **attrs) -> "Span":
+        self.attrs.update(attrs)
+        return self
+
+    def add(self, key: str, value: Number = 1) -> "Span":
+        self.attrs[key] = self.attrs.get(key, 0) + value
+        return self
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        _tracer.finish(self)
+        return False
+
+
+class _NoopSpan:
+    """
+    Returned when tracing is disabled; every method does nothing.
+    """
+    __slots__ = ()
+    name = path = ""
+    attrs: dict = {}
+    duration = 0.0
+
+    def set(self, **attrs) -> "_NoopSpan":
+        return self
+
+    def add(self, key: str, value: Number = 1) -> "_NoopSpan":
+        return self
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+_current: contextvars.ContextVar = contextvars.ContextVar("rag_span", default=None)
+
+
+class LogSink:
+    """
+    One log line per finished span: `span=qa.retrieve ms=12.3 documents=3`.
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO):
+        self.logger = logger or _log
+        self.level = level
+
+    def emit(self, span: Span):
+        fields = " ".join(f"{k}={v}" for k, v in span.attrs.items())
+        error = f" error={span.error}" if span.error else ""
+        self.logger.log(self.level, f"span={span.path} ms={span.duration * 1000:.1f}{error} {fields}".rstrip())
+
+    def flush(self):
+        pass
+
+
+class PrometheusSink:
+    """
+    Aggregates spans into Prometheus text-format metrics and rewrites `path`
+    after every top-level span (suitable for node_exporter's textfile
+    collector):
+
+        rag_stage_seconds_sum / _count   per stage
+        rag_stage_errors_total           per stage
+        rag_stage_items_total            numeric span attributes, per stage and item
+        rag_stage_events_total           outcome attributes listed in `event_keys`
+
+    Other string attributes (paths, questions) are left out to keep label
+    cardinality bounded.
+    """
+
+    def __init__(self, path: Union[str, Path], prefix: str = "rag", event_keys=DEFAULT_EVENT_KEYS):
+        self.path = Path(path)
+        self.prefix = prefix
+        self.event_keys = set(event_keys)
+        self._lock = threading.Lock()
+        self._seconds: Dict[str, float] = defaultdict(float)
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._items: Dict[tuple, float] = defaultdict(float)
+        self._events: Dict[tuple, int] = defaultdict(int)
+
+    def emit(self, span: Span):
+        stage = span.path
+        with self._lock:
+            self._seconds[stage] += span.duration
+            self._counts[stage] += 1
+            if span.error:
+                self._errors[stage] += 1
+            for key, value in span.attrs.items():
+                if key in self.event_keys:
+                    self._events[(stage, key, str(value).lower())] += 1
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._items[(stage, key)] += value
+        if span.parent is None:
+            self.flush()
+
+    def render(self) -> str:
+        p = self.prefix
+        lines = [f"# TYPE {p}_stage_seconds summary"]
+        with self._lock:
+            for stage in sorted(self._counts):
+                lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {self._seconds[stage]:.6f}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {self._counts[stage]}')
+            lines.append(f"# TYPE {p}_stage_errors_total counter")
+            for stage, count in sorted(self._errors.items()):
+                lines.append(f'{p}_stage_errors_total{{stage="{stage}"}} {count}')
+            lines.append(f"# TYPE {p}_stage_items_total counter")
+            for (stage, item), value in sorted(self._items.items()):
+                lines.append(f'{p}_stage_items_total{{stage="{stage}",item="{item}"}} {value:g}')
+            lines.append(f"# TYPE {p}_stage_events_total counter")
+            for (stage, key, value), count in sorted(self._events.items()):
+                lines.append(f'{p}_stage_events_total{{stage="{stage}",key="{key}",value="{value}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+
+class CollectorSink:
+    """
+    Keeps finished spans in memory.
+    """
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def emit(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def by_name(self, name: str) -> List[Span]:
+        return [s for s in self.spans if s.name == name or s.path == name]
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+    def flush(self):
+        pass
+
+
+class Tracer:
+    def __init__(self, sinks: Optional[list] = None):
+        self.sinks = list(sinks or [])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks)
+
+    def span(self, name: str, **attrs):
+        if not self.sinks:
+            return NOOP_SPAN
+        return Span(name, attrs, _current.get())
+
+    def finish(self, span: Span):
+        for sink in self.sinks:
+            try:
+                sink.emit(span)
+            except Exception as e:
+                _log.warning(f"Tracing sink {type(sink).__name__} failed: {e}")
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+
+def sinks_from_env(value: Optional[str] = None) -> list:
+    """
+    Parse RAG_TRACE: a comma-separated list of `log`, `prom:<path>`.
+    """
+    value = os.environ.get("RAG_TRACE", "") if value is None else value
+    sinks = []
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        if part == "log":
+            sinks.append(LogSink())
+        elif part.startswith("prom:"):
+            sinks.append(PrometheusSink(part[len("prom:"):]))
+        else:
+            _log.warning(f"Ignoring unknown RAG_TRACE sink {part!r}")
+    return sinks
+
+
+_tracer = Tracer(sinks_from_env())
+
+
+def configure_tracing(*sinks) -> Tracer:
+    """
+    Replace the active sinks; call with no arguments to disable tracing.
+    """
+    _tracer.flush()
+    _tracer.sinks = list(sinks)
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def span(name: str, **attrs):
+    return _tracer.span(name, **attrs)
+
+
+def current_span():
+    """
+    The innermost active span, or the no-op span. Lets library code attach
+    details (cache outcomes, counts) to whatever stage called it.
+    """
+    return _current.get() or NOOP_SPAN
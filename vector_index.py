@@ -0,0 +1,501 @@
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from embedding_cache import DEFAULT_MODEL_NAME, CachedEmbeddings
+from tracing import current_span
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = Path("vector_index")
+META_FILE = "index_meta.json"
+FLAT = "Flat"
+# Named compression levels; anything else is passed to faiss.index_factory.
+# Bytes per 384-d vector: flat 1536, fp16 768, sq8 384, ivfpq 48 (+ IVF lists).
+INDEX_PRESETS = ("flat", "fp16", "sq8", "ivfsq8", "ivfpq")
+
+
+def default_embeddings(model_name: str = DEFAULT_MODEL_NAME, batch_size: int = 64,
+                       backend: Optional[str] = None, threads: Optional[int] = None) -> Embeddings:
+    """
+    The MiniLM embedder behind the on-disk chunk embedding cache. `backend`
+    (default: $EMBEDDING_BACKEND) picks one of embedding_backends.BACKENDS,
+    with `threads` (default: $EMBEDDING_THREADS) intra-op threads; without
+    a backend the HuggingFaceEmbeddings path is used as before.
+    """
+    backend = backend or os.environ.get("EMBEDDING_BACKEND")
+    if backend:
+        from embedding_backends import make_embeddings
+        if threads is None and os.environ.get("EMBEDDING_THREADS"):
+            threads = int(os.environ["EMBEDDING_THREADS"])
+        model = make_embeddings(backend, model_name, threads=threads)
+        # Quantized vectors differ slightly, so they are cached separately. The
+        # backend does its own length-bucketed batching, so it gets large slices.
+        return CachedEmbeddings(model, f"{model_name}@{backend}", batch_size=max(batch_size, 1024))
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    model = HuggingFaceEmbeddings(model_name=model_name, encode_kwargs={"batch_size": batch_size})
+    return CachedEmbeddings(model, model_name, batch_size=batch_size)
+
+
+def _texts_fingerprint(texts: List[str], metadatas: Optional[List[dict]] = None) -> str:
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    # Without metadatas the hash stays what it was for text-only indexes.
+    for metadata in metadatas or []:
+        digest.update(json.dumps(metadata, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def resolve_factory(index_type: str, dimension: int, expected_vectors: int = 0) -> str:
+    """
+    faiss.index_factory string for a preset name (see INDEX_PRESETS). IVF
+    list counts follow the usual ~4*sqrt(n) rule for the expected corpus
+    size; PQ uses 8 dimensions per sub-quantizer.
+    """
+    nlist = max(16, int(4 * math.sqrt(expected_vectors))) if expected_vectors else 1024
+    presets = {
+        "flat": FLAT,
+        "fp16": "SQfp16",
+        "sq8": "SQ8",
+        "ivfsq8": f"IVF{nlist},SQ8",
+        "ivfpq": f"IVF{nlist},PQ{max(1, dimension // 8)}",
+    }
+    return presets.get(index_type, index_type)
+
+
+def _new_faiss_index(dimension: int, factory: str):
+    if factory == FLAT:
+        return faiss.IndexFlatL2(dimension)
+    return faiss.index_factory(dimension, factory)
+
+
+def document_positions(vector_store: FAISS, doc_id: str) -> np.ndarray:
+    """
+    FAISS positions of the chunks of `doc_id` (docstore ids "<doc_id>::<n>").
+    One pass over the id map, so callers look them up once per chain rather
+    than per query.
+    """
+    prefix = f"{doc_id}::"
+    return np.fromiter((position for position, chunk_id in vector_store.index_to_docstore_id.items()
+                        if chunk_id.startswith(prefix)), dtype=np.int64)
+
+
+def search_positions(index, query_vectors: np.ndarray, positions: np.ndarray,
+                     k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (distances, positions) of the top-k among `positions` only, one row per
+    query, like `index.search`; positions are padded with -1.
+    Flat-code indexes reconstruct just those vectors, so the cost follows
+    the document's size, not the corpus'. IVF indexes search with an ID
+    selector over every list: the default nprobe lists may not hold any of
+    the document's vectors.
+    """
+    query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+    k = min(k, len(positions))
+    if k == 0:
+        empty = (len(query_vectors), 0)
+        return np.zeros(empty, dtype=np.float32), np.zeros(empty, dtype=np.int64)
+    if isinstance(index, faiss.IndexFlatCodes):
+        vectors = index.reconstruct_batch(positions)
+        distances = ((query_vectors ** 2).sum(axis=1)[:, None] - 2 * query_vectors @ vectors.T
+                     + (vectors ** 2).sum(axis=1)[None, :])
+        order = np.argsort(distances, axis=1)[:, :k]
+        return np.take_along_axis(distances, order, axis=1), positions[order]
+    selector = faiss.IDSelectorBatch(positions)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nlist)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return index.search(query_vectors, k, params=params)
+
+
+class DocumentRetriever(BaseRetriever):
+    """
+    Top-k chunks of one document of a shared index, searched among that
+    document's vectors only (see `search_positions`).
+    """
+    vector_store: Any
+    positions: Any
+    k: int = 3
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        query_vector = np.asarray([self.vector_store.embedding_function.embed_query(query)], dtype=np.float32)
+        _, found = search_positions(self.vector_store.index, query_vector, self.positions, self.k)
+        id_map = self.vector_store.index_to_docstore_id
+        return [self.vector_store.docstore.search(id_map[int(p)]) for p in found[0] if p >= 0]
+
+
+def make_retriever(vector_store: FAISS, k: int = 3, doc_id: Optional[str] = None) -> BaseRetriever:
+    """
+    Retriever for `k` chunks, restricted to one document when `doc_id` is
+    given.
+    """
+    if doc_id is None:
+        return vector_store.as_retriever(search_kwargs={"k": k})
+    return DocumentRetriever(vector_store=vector_store, positions=document_positions(vector_store, doc_id), k=k)
+
+
+class PersistentIndex:
+    """
+    FAISS vector store persisted in `index_dir` that can be appended to and
+    pruned per document. The embedding model name and dimension are stored
+    next to the index so it is never queried with a different model.
+
+    The index defaults to exact flat float32. Compressed types (`fp16`,
+    `sq8`, `ivfpq`, ... or any faiss factory string) need `train()` before
+    the first add, or are built from an existing index with
+    `compress_index()`. With `mmap=True` the index file is memory-mapped
+    read-only, so several query workers share one copy in the page cache.
+
+    Documents can only be deleted or replaced in flat-code indexes (flat,
+    fp16, sq8): IVF indexes keep their labels on removal, which the FAISS
+    wrapper's position-based docstore map does not allow for. Rebuild those
+    from an updated flat index with `compress_index()` instead.
+    """
+
+    def __init__(self, index_dir: Union[str, Path], embeddings: Embeddings, model_name: str,
+                 vector_store: FAISS, meta: dict, read_only: bool = False):
+        self.index_dir = Path(index_dir)
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.vector_store = vector_store
+        self.meta = meta
+        self.read_only = read_only
+        self._dirty = not (self.index_dir / META_FILE).exists()
+        if meta.get("nprobe"):
+            self.set_nprobe(meta["nprobe"])
+
+    @classmethod
+    def load_or_create(cls, index_dir: Union[str, Path] = DEFAULT_INDEX_DIR, model_name: str = DEFAULT_MODEL_NAME,
+                       embeddings: Optional[Embeddings] = None, index_type: str = "flat",
+                       mmap: bool = False) -> "PersistentIndex":
+        """
+        Load the index in `index_dir` or create an empty one. `index_type`
+        only applies to a new index; an existing one keeps the type it was
+        built with.
+        """
+        index_dir = Path(index_dir)
+        embeddings = embeddings or default_embeddings(model_name)
+        meta_path = index_dir / META_FILE
+
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta["model_name"] != model_name:
+                raise ValueError(
+                    f"Index at {index_dir} was built with {meta['model_name']!r}, not {model_name!r}; "
+                    f"rebuild it or point to another index directory."
+                )
+            if mmap:
+                vector_store = _load_mmap(index_dir, embeddings, meta.get("index_factory", FLAT))
+            else:
+                vector_store = FAISS.load_local(str(index_dir), embeddings, allow_dangerous_deserialization=True)
+            if vector_store.index.d != meta["dimension"]:
+                raise ValueError(
+                    f"Index at {index_dir} has dimension {vector_store.index.d}, metadata says {meta['dimension']}"
+                )
+            _log.info(f"Loaded {meta.get('index_factory', FLAT)} vector index from {index_dir} "
+                      f"({vector_store.index.ntotal} vectors{', mmap' if mmap else ''})")
+            return cls(index_dir, embeddings, model_name, vector_store, meta, read_only=mmap)
+
+        dimension = len(embeddings.embed_query("dimension probe"))
+        factory = resolve_factory(index_type, dimension)
+        vector_store = FAISS(
+            embedding_function=embeddings,
+            index=_new_faiss_index(dimension, factory),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+        )
+        meta = {"model_name": model_name, "dimension": dimension, "version": 0, "documents": {},
+                "index_factory": factory}
+        _log.info(f"Created empty {factory} vector index in {index_dir}")
+        return cls(index_dir, embeddings, model_name, vector_store, meta)
+
+    @property
+    def index_factory(self) -> str:
+        return self.meta.get("index_factory", FLAT)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.vector_store.index.is_trained
+
+    def train(self, texts: Optional[List[str]] = None, vectors: Optional[np.ndarray] = None):
+        """
+        Train a compressed index on a sample of the corpus, given as chunk
+        texts or as already computed vectors.
+        """
+        if vectors is None:
+            vectors = np.asarray(self.embeddings.embed_documents(texts or []), dtype=np.float32)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        start_time = time.perf_counter()
+        self.vector_store.index.train(vectors)
+        self.meta["trained_on"] = len(vectors)
+        self._dirty = True
+        _log.info(f"Trained {self.index_factory} on {len(vectors)} vectors in {time.perf_counter() - start_time:.1f}s")
+
+    def set_nprobe(self, nprobe: int):
+        """
+        Number of IVF lists searched per query (recall vs. speed); ignored
+        by index types without lists.
+        """
+        if "IVF" in self.index_factory:
+            faiss.ParameterSpace().set_index_parameter(self.vector_store.index, "nprobe", nprobe)
+            self.meta["nprobe"] = nprobe
+
+    @property
+    def documents(self) -> Dict[str, dict]:
+        return self.meta["documents"]
+
+    @property
+    def version(self) -> int:
+        return self.meta["version"]
+
+    def has_document(self, doc_id: str, texts: Optional[List[str]] = None,
+                     metadatas: Optional[List[dict]] = None) -> bool:
+        """
+        True if `doc_id` is indexed (and, when `texts` is given, indexed from
+        exactly these chunk texts and metadatas).
+        """
+        entry = self.documents.get(doc_id)
+        if entry is None:
+            return False
+        return texts is None or entry["fingerprint"] == _texts_fingerprint(texts, metadatas)
+
+    def add_document(self, doc_id: str, texts: List[str], metadatas: Optional[List[dict]] = None) -> List[str]:
+        """
+        Embed and index the chunks of one document. A document that is
+        already indexed from the same chunks is left untouched; otherwise its
+        old vectors are replaced.
+        """
+        if self.read_only:
+            raise ValueError(f"Index at {self.index_dir} is memory-mapped read-only")
+        if not self.is_trained:
+            raise ValueError(f"{self.index_factory} index at {self.index_dir} must be trained first; "
+                             f"call train() with a corpus sample or build it with compress_index()")
+        if self.has_document(doc_id, texts, metadatas):
+            current_span().set(index="unchanged")
+            _log.info(f"{doc_id} already indexed, skipping")
+            return self.documents[doc_id]["ids"]
+        current_span().set(index="replaced" if doc_id in self.documents else "added")
+        if doc_id in self.documents:
+            self.delete_document(doc_id)
+
+        fingerprint = _texts_fingerprint(texts, metadatas)
+        metadatas = [dict(m) for m in metadatas] if metadatas else [{} for _ in texts]
+        for metadata in metadatas:
+            metadata["doc_id"] = doc_id
+        ids = [f"{doc_id}::{i}" for i in range(len(texts))]
+        if texts:
+            self.vector_store.add_texts(texts, metadatas=metadatas, ids=ids)
+        self.documents[doc_id] = {"ids": ids, "fingerprint": fingerprint}
+        self._dirty = True
+        _log.info(f"Indexed {len(ids)} chunks for {doc_id}")
+        return ids
+
+    @property
+    def supports_delete(self) -> bool:
+        """
+        Flat-code indexes compact on `remove_ids`, which is what
+        FAISS.delete assumes when it renumbers `index_to_docstore_id`.
+        """
+        return isinstance(self.vector_store.index, faiss.IndexFlatCodes)
+
+    def delete_document(self, doc_id: str) -> int:
+        if self.read_only:
+            raise ValueError(f"Index at {self.index_dir} is memory-mapped read-only")
+        entry = self.documents.get(doc_id)
+        if entry is None:
+            return 0
+        if entry["ids"] and not self.supports_delete:
+            raise ValueError(f"Cannot delete or replace {doc_id} in the {self.index_factory} index at "
+                             f"{self.index_dir}; update the flat index and rebuild this one with compress_index()")
+        del self.documents[doc_id]
+        if entry["ids"]:
+            self.vector_store.delete(entry["ids"])
+        self._dirty = True
+        _log.info(f"Removed {len(entry['ids'])} chunks for {doc_id}")
+        return len(entry["ids"])
+
+    def save(self):
+        if not self._dirty:
+            return
+        if self.read_only:
+            raise ValueError(f"Index at {self.index_dir} is memory-mapped read-only")
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.meta["version"] += 1
+        self.vector_store.save_local(str(self.index_dir))
+        meta_path = self.index_dir / META_FILE
+        tmp_path = meta_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.meta, indent=2), encoding="utf-8")
+        tmp_path.replace(meta_path)
+        self._dirty = False
+
+    def as_retriever(self, **kwargs):
+        return self.vector_store.as_retriever(**kwargs)
+
+
+def _load_mmap(index_dir: Path, embeddings: Embeddings, factory: str = FLAT) -> FAISS:
+    """
+    Same files as FAISS.load_local, but the FAISS index is memory-mapped
+    read-only instead of read into private memory. IO_FLAG_MMAP only maps
+    IVF inverted lists; flat-code indexes need IO_FLAG_MMAP_IFC (faiss 1.9+).
+    The two flags cannot be combined on an IVF index.
+    """
+    if "IVF" in factory:
+        flags = faiss.IO_FLAG_MMAP
+    elif hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        flags = faiss.IO_FLAG_MMAP_IFC
+    else:
+        _log.warning(f"faiss {faiss.__version__} cannot memory-map {factory} indexes; reading into memory")
+        flags = 0
+    index = faiss.read_index(str(index_dir / "index.faiss"), flags | faiss.IO_FLAG_READ_ONLY)
+    with open(index_dir / "index.pkl", "rb") as fp:
+        docstore, index_to_docstore_id = pickle.load(fp)
+    return FAISS(embedding_function=embeddings, index=index, docstore=docstore,
+                 index_to_docstore_id=index_to_docstore_id)
+
+
+def _reconstruct(index, ids: np.ndarray) -> np.ndarray:
+    return np.vstack([index.reconstruct(int(i)) for i in ids]) if len(ids) else np.empty((0, index.d), "float32")
+
+
+def compress_index(source_dir: Union[str, Path], target_dir: Union[str, Path], index_type: str = "ivfpq",
+                   sample_size: int = 100_000, nprobe: int = 16, batch_size: int = 65_536,
+                   embeddings: Optional[Embeddings] = None, seed: int = 0) -> PersistentIndex:
+    """
+    Build a compressed copy of the (flat) index in `source_dir`: train on a
+    random sample of its vectors, then add every vector in batches in the
+    same order, so the docstore and document map carry over unchanged.
+    """
+    source = PersistentIndex.load_or_create(source_dir, embeddings=embeddings)
+    src_index = source.vector_store.index
+    total = src_index.ntotal
+    if source.index_factory != FLAT:
+        raise ValueError(f"compress_index needs a flat source index, {source_dir} is {source.index_factory}")
+    if set(source.vector_store.index_to_docstore_id) != set(range(total)):
+        raise ValueError(f"Index at {source_dir} has non-contiguous vector positions; it cannot be copied in order")
+    factory = resolve_factory(index_type, src_index.d, total)
+
+    target_index = _new_faiss_index(src_index.d, factory)
+    vector_store = FAISS(embedding_function=source.embeddings, index=target_index,
+                         docstore=source.vector_store.docstore,
+                         index_to_docstore_id=dict(source.vector_store.index_to_docstore_id))
+    meta = dict(source.meta, index_factory=factory, version=0, compressed_from=str(source_dir))
+    meta.pop("nprobe", None)
+    target = PersistentIndex(target_dir, source.embeddings, source.model_name, vector_store, meta)
+    target._dirty = True
+
+    if not target_index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample_ids = np.sort(rng.choice(total, size=min(sample_size, total), replace=False))
+        target.train(vectors=_reconstruct(src_index, sample_ids))
+    for start in range(0, total, batch_size):
+        count = min(batch_size, total - start)
+        target_index.add(src_index.reconstruct_n(start, count))
+    target.set_nprobe(nprobe)
+    target.save()
+    _log.info(f"Compressed {total} vectors from {source_dir} into {factory} at {target_dir}")
+    return target
+
+
+def index_bytes(index_dir: Union[str, Path]) -> int:
+    path = Path(index_dir) / "index.faiss"
+    return path.stat().st_size if path.exists() else 0
+
+
+def recall_at_k(exact: PersistentIndex, approx: PersistentIndex, k: int = 10, num_queries: int = 1000,
+                queries: Optional[List[str]] = None, seed: int = 0) -> dict:
+    """
+    Mean share of the exact top-k chunks that `approx` also returns in its
+    top-k. Queries are embedded from `queries` or, by default, a random
+    sample of the stored chunk vectors.
+    """
+    if queries:
+        query_vectors = np.asarray(exact.embeddings.embed_documents(queries), dtype=np.float32)
+    else:
+        total = exact.vector_store.index.ntotal
+        rng = np.random.default_rng(seed)
+        query_vectors = _reconstruct(exact.vector_store.index,
+                                     rng.choice(total, size=min(num_queries, total), replace=False))
+
+    def search(store: PersistentIndex):
+        start_time = time.perf_counter()
+        _, positions = store.vector_store.index.search(query_vectors, k)
+        seconds = time.perf_counter() - start_time
+        mapping = store.vector_store.index_to_docstore_id
+        return [{mapping[p] for p in row if p >= 0} for row in positions], seconds
+
+    exact_hits, exact_seconds = search(exact)
+    approx_hits, approx_seconds = search(approx)
+    recalls = [len(e & a) / len(e) for e, a in zip(exact_hits, approx_hits) if e]
+    queries_run = max(1, len(query_vectors))
+    return {
+        "k": k,
+        "queries": len(query_vectors),
+        "index_factory": approx.index_factory,
+        "nprobe": approx.meta.get("nprobe"),
+        f"recall@{k}": round(sum(recalls) / len(recalls), 4) if recalls else None,
+        "exact_ms_per_query": round(exact_seconds * 1000 / queries_run, 3),
+        "approx_ms_per_query": round(approx_seconds * 1000 / queries_run, 3),
+        "exact_bytes": index_bytes(exact.index_dir),
+        "approx_bytes": index_bytes(approx.index_dir),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build compressed vector indexes and measure their recall.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("compress", help="Build a compressed copy of an index")
+    p.add_argument("source_dir")
+    p.add_argument("target_dir")
+    p.add_argument("--type", default="ivfpq", help=f"One of {INDEX_PRESETS} or a faiss factory string")
+    p.add_argument("--sample-size", type=int, default=100_000)
+    p.add_argument("--nprobe", type=int, default=16)
+
+    p = sub.add_parser("recall", help="recall@k of a compressed index against the exact one")
+    p.add_argument("exact_dir")
+    p.add_argument("approx_dir")
+    p.add_argument("-k", type=int, default=10)
+    p.add_argument("--queries", type=int, default=1000)
+    p.add_argument("--nprobe", type=int, nargs="+", help="Evaluate several nprobe values")
+    p.add_argument("--mmap", action="store_true", help="Memory-map the compressed index")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "compress":
+        target = compress_index(args.source_dir, args.target_dir, args.type, args.sample_size, args.nprobe)
+        print(f"✅ {target.index_factory}: {index_bytes(args.source_dir) / 1024 ** 2:.1f} MiB -> "
+              f"{index_bytes(args.target_dir) / 1024 ** 2:.1f} MiB")
+        return
+
+    exact = PersistentIndex.load_or_create(args.exact_dir)
+    approx = PersistentIndex.load_or_create(args.approx_dir, embeddings=exact.embeddings, mmap=args.mmap)
+    for nprobe in args.nprobe or [approx.meta.get("nprobe")]:
+        if nprobe:
+            approx.set_nprobe(nprobe)
+        print(json.dumps(recall_at_k(exact, approx, k=args.k, num_queries=args.queries)))
+
+
+if __name__ == "__main__":
+    main()